@@ -0,0 +1,748 @@
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import asyncio
+import functools
+import json
+import os
+import time
+
+import gradio as gr
+from gradio import ChatMessage
+from openai import AsyncOpenAI
+
+from tools import TOOLS_FUNCTIONS, TOOLS_SPECS
+from utils.cache import LRUCache, canonical_key
+from utils.completion_cache import CompletionCache
+from utils.context import fit_messages, get_token_budget
+from utils.conversation_store import get_conversation_store
+from utils.deadlines import TOOL_TIMEOUT, TURN_TIMEOUT, ToolTimeout, run_until
+from utils.executor import execute_tools
+from utils.geocode_cache import get_geocode_cache
+from utils.gmaps import client_stats
+from utils.logger import DroppingQueueHandler, log_payload, setup_logger
+from utils.memory import MemoryStore
+from utils.metrics import TurnSpan, collect_stats
+from utils.model_router import get_model_router
+from utils.places_index import get_places_index
+from utils.prefetch import get_page_prefetcher
+from utils.projection import TOOL_RESULT_PROJECTION, dumps, project_tool_result
+from utils.results import (
+    RESULT_STORE,
+    RESULT_STORE_COLLAPSE_OLD_TURNS,
+    RESULT_STORE_MIN_TOKENS,
+    ResultStore,
+    collapse_stored_results,
+    last_handle_number,
+    omitted_from,
+    summary_envelope,
+)
+from utils.scheduler import get_scheduler
+from utils.schemas import compact_schema
+from utils.sessions import SessionStore
+from utils.speculation import SPECULATIVE_TOOLS, ToolSpeculator
+from utils.streaming import StreamAccumulator, close_stream
+from utils.tokens import estimate_tokens
+from utils.ui_updates import UpdateCoalescer
+
+# Setup logger
+logger = setup_logger()
+
+AVAILABLE_MODELS = [
+    "anthropic/claude-3.5-sonnet",
+    "anthropic/claude-3-opus",
+    "anthropic/claude-3-haiku",
+    "openai/gpt-4-turbo",
+    "openai/gpt-4",
+    "openai/gpt-3.5-turbo",
+    "google/gemini-pro-1.5",
+    "meta-llama/llama-3.1-70b-instruct",
+    "mistralai/mistral-large",
+]
+
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+SESSION_IDLE_TTL = int(os.getenv("SESSION_IDLE_TTL", "3600"))
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "1000"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(256 * 1024 * 1024)))
+TOOLS_CACHE_MAX_ENTRIES = int(os.getenv("TOOLS_CACHE_MAX_ENTRIES", "2048"))
+TOOLS_CACHE_MAX_BYTES = int(os.getenv("TOOLS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+TOOLS_CACHE_DEFAULT_TTL = int(os.getenv("TOOLS_CACHE_DEFAULT_TTL", "3600"))
+TOOLS_COMPACT_SCHEMA = os.getenv("TOOLS_COMPACT_SCHEMA", "true").lower() == "true"
+COMPLETION_CACHE = os.getenv("COMPLETION_CACHE", "false").lower() == "true"
+COMPLETION_CACHE_PATH = os.getenv("COMPLETION_CACHE_PATH") or None
+COMPLETION_CACHE_TTL = int(os.getenv("COMPLETION_CACHE_TTL", str(24 * 60 * 60)))
+MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", "10"))
+MEMORY_DISPLAY_MAX = int(os.getenv("MEMORY_DISPLAY_MAX", "50"))
+
+DEFAULT_SYSTEM_PROMPT = open('prompts/system.txt', 'r').read().strip()
+
+ERROR_MESSAGE = "Sorry, an error occurred while processing your message."
+TIMEOUT_MESSAGE = "Sorry, this is taking too long, I stopped working on your message."
+# Seconds between updates of the queue position shown while a turn waits for admission
+QUEUE_STATUS_INTERVAL = 1.0
+
+ALL_TOOL_NAMES = [spec["name"] for spec in TOOLS_SPECS.values()]
+
+def new_app_context():
+    """Fresh per-session state: model settings, memory and conversation history"""
+    return {
+        "model_id": "anthropic/claude-3.5-sonnet",
+        "max_tokens": 1024,
+        "system_memory": MemoryStore(),
+        "tool_results": ResultStore(),
+        "history": []
+    }
+
+conversation_store = get_conversation_store()
+
+def load_app_context(session_id):
+    """Per-session state as persisted by an earlier process (or before eviction), or None"""
+    saved = conversation_store.load(session_id)
+    if saved is None:
+        return None
+    app_context = new_app_context()
+    app_context.update(
+        model_id=saved["model_id"],
+        max_tokens=saved["max_tokens"],
+        history=saved["history"],
+        system_memory=MemoryStore(saved["memories"])
+    )
+    memory_version = app_context["system_memory"].version
+    app_context["persisted"] = {**saved["persisted"], "memory_version": memory_version}
+    # Results aren't persisted: handles in the history stay unfetchable rather than naming
+    # new results
+    first_handle = last_handle_number(saved["history"]) + 1
+    app_context["tool_results"] = ResultStore(first_handle=first_handle)
+    return app_context
+
+def save_app_context(session_id, app_context):
+    if conversation_store:
+        conversation_store.save(session_id, app_context)
+
+sessions = SessionStore(
+    new_app_context,
+    idle_ttl=SESSION_IDLE_TTL,
+    max_sessions=SESSION_MAX_COUNT,
+    max_bytes=SESSION_MAX_BYTES,
+    loader=load_app_context if conversation_store else None
+)
+
+tools_cache = LRUCache(max_entries=TOOLS_CACHE_MAX_ENTRIES, max_bytes=TOOLS_CACHE_MAX_BYTES)
+
+completion_cache = None
+if COMPLETION_CACHE:
+    completion_cache = CompletionCache(ttl=COMPLETION_CACHE_TTL, path=COMPLETION_CACHE_PATH)
+
+collect_stats("sessions", sessions.stats)
+collect_stats("tools_cache", tools_cache.stats)
+collect_stats("google_maps", client_stats)
+collect_stats("geocode_cache", get_geocode_cache().stats)
+collect_stats("places_index", get_places_index().stats)
+collect_stats("page_prefetcher", get_page_prefetcher().stats)
+collect_stats("logger", lambda: {"dropped_records": DroppingQueueHandler.dropped})
+collect_stats("model_router", get_model_router().stats)
+collect_stats("scheduler", get_scheduler().stats)
+if completion_cache:
+    collect_stats("completion_cache", completion_cache.stats)
+if conversation_store:
+    collect_stats("conversation_store", conversation_store.stats)
+
+client = AsyncOpenAI(
+    base_url=os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"),
+    api_key=os.environ["OPENROUTER_API_KEY"]
+)
+
+def get_memory_string(app_context, query=None):
+    """Memories for the system prompt: only the `MEMORY_TOP_K` most relevant to `query` once
+    there are more"""
+    system_memory = app_context["system_memory"]
+    positions = system_memory.relevant(query, MEMORY_TOP_K)
+    return "\n".join([f"{index}: {system_memory[index]}" for index in positions]).strip()
+
+def get_memory_markdown(app_context):
+    system_memory = list(app_context["system_memory"])
+    start = max(0, len(system_memory) - MEMORY_DISPLAY_MAX)
+    markdown = "\n".join(
+        [f"{index}. {system_memory[index]}" for index in range(start, len(system_memory))]
+    ).strip()
+    if start:
+        markdown = f"_{start} older memories not shown_\n\n{markdown}"
+    return markdown
+
+def get_last_user_message(app_context):
+    return next((
+        entry["content"] for entry in reversed(app_context["history"]) if entry["role"] == "user"
+    ), None)
+
+def get_tool_cache_ttl(tool_name, tool_input):
+    """Seconds a tool result may be cached for, or None if the tool declared itself non-cacheable"""
+    spec = TOOLS_SPECS[tool_name]
+    if not spec.get("cacheable", True):
+        return None
+    ttl = spec.get("cache_ttl", TOOLS_CACHE_DEFAULT_TTL)
+    return ttl(tool_input) if callable(ttl) else ttl
+
+def serialize_tool_result(app_context, enabled_tools, tool_name, tool_input, tool_result):
+    """Project a tool result down to the fields the model needs, encoded as minified JSON.
+
+    Large results are kept whole in the session's result store; the model gets the
+    projection as a summary plus a handle it can fetch the rest with (as long as
+    `tool_fetch_result` is among the enabled tools).
+    """
+    if not TOOL_RESULT_PROJECTION:
+        return str(tool_result)
+
+    spec = TOOLS_SPECS[tool_name]
+    summary = project_tool_result(spec, tool_input, tool_result)
+    content = dumps(summary)
+    full_content = dumps(tool_result)
+    full_tokens = estimate_tokens(full_content)
+
+    # Stored results are only worth it when the model can fetch them
+    storable = RESULT_STORE and "tool_fetch_result" in enabled_tools
+    if storable and spec.get("result_store", True) and full_tokens >= RESULT_STORE_MIN_TOKENS:
+        items_key = spec.get("result_items_key")
+        omitted = omitted_from(tool_result, summary, items_key)
+        handle = None
+        if omitted:
+            handle = app_context["tool_results"].put(
+                tool_name, tool_input, tool_result, size=len(full_content), items_key=items_key
+            )
+        if handle:
+            content = summary_envelope(handle, summary, omitted)
+
+    logger.info(
+        f"Tool {tool_name} result projected: {full_tokens} -> {estimate_tokens(content)} tokens"
+    )
+    return content
+
+@functools.lru_cache(maxsize=64)
+def _convert_tools(enabled_tools, compact=TOOLS_COMPACT_SCHEMA):
+    """Convert Anthropic-format tool specs to OpenAI function-calling format.
+
+    Memoized per frozenset of enabled tools; returns the payload and its token cost.
+    """
+    converted_tools = [
+        {
+            "type": "function",
+            "function": {
+                "name": spec["name"],
+                "description": spec["description"],
+                "parameters": (
+                    compact_schema(spec["input_schema"]) if compact else spec["input_schema"]
+                )
+            }
+        }
+        for spec in TOOLS_SPECS.values()
+        if spec["name"] in enabled_tools
+    ]
+    schema_tokens = estimate_tokens(converted_tools) if converted_tools else 0
+    return converted_tools, schema_tokens
+
+async def prompt_claude(
+    app_context, system_prompt, enabled_tools, temperature, top_p, frequency_penalty,
+    presence_penalty, stream=False, span=None
+):
+    system_prompt_memory_str = get_memory_string(app_context, get_last_user_message(app_context))
+    system_prompt_text = system_prompt
+    if system_prompt_memory_str:
+        memory_count = len(app_context["system_memory"])
+        if memory_count > MEMORY_TOP_K:
+            system_prompt_text += (
+                "\n\nHere are the memories the user asked you to remember most relevant to this "
+                f"message ({MEMORY_TOP_K} of {memory_count}, prefixed by their index):\n"
+                f"{system_prompt_memory_str}"
+            )
+        else:
+            system_prompt_text += (
+                "\n\nHere are the memories the user asked you to remember:\n"
+                f"{system_prompt_memory_str}"
+            )
+
+    model_id = app_context["model_id"]
+    max_tokens = app_context["max_tokens"]
+
+    converted_tools, schema_tokens = _convert_tools(frozenset(enabled_tools))
+    logger.debug(f"Tool schemas: {len(converted_tools)} tools, {schema_tokens} tokens")
+
+    # Keep the prompt within the model's token budget, however long the session gets
+    token_budget = get_token_budget(model_id, max_tokens, reserved_tokens=schema_tokens)
+    system_message = {"role": "system", "content": system_prompt_text}
+    messages, context_stats = fit_messages(system_message, app_context["history"], token_budget)
+    if context_stats["tool_results_dropped"] or context_stats["turns_evicted"]:
+        logger.info(f"Context trimmed to {token_budget} token budget: {context_stats}")
+    if context_stats["tokens_after"] > token_budget:
+        logger.warning(
+            f"Prompt still over its {token_budget} token budget after trimming: {context_stats}"
+        )
+
+    kwargs = dict(
+        model=model_id,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        top_p=top_p,
+        frequency_penalty=frequency_penalty,
+        presence_penalty=presence_penalty,
+        messages=messages
+    )
+    if converted_tools:
+        kwargs["tools"] = converted_tools
+
+    # Deterministic requests we've already seen are replayed from the completion cache
+    cache_key = None
+    if completion_cache and completion_cache.is_cacheable(kwargs):
+        cache_key = completion_cache.key(kwargs)
+        cached = await completion_cache.get(cache_key)
+        if cached:
+            logger.info(
+                f"Completion cache hit: saved {cached['latency']:.2f}s, usage {cached['usage']}"
+            )
+            if span:
+                span.llm_cache_hit = True
+            if stream:
+                return completion_cache.replay_stream(cached)
+            return completion_cache.replay_response(cached)
+
+    if stream:
+        kwargs["stream"] = True
+        kwargs["stream_options"] = {"include_usage": True}
+
+    # The selected model may hand over to a fallback (on failure) or a hedged request (when slow)
+    started_at = time.time()
+    response, served_model = await get_model_router().create(
+        client.chat.completions.create, kwargs, stream=stream
+    )
+    if served_model != model_id:
+        logger.warning(f"Request for {model_id} served by {served_model}")
+        cache_key = None
+    if span:
+        span.llm_model = served_model
+    if cache_key:
+        if stream:
+            response = completion_cache.record_stream(cache_key, response, started_at)
+        else:
+            latency = time.time() - started_at
+            completion_cache.set(cache_key, response.choices[0].message, response.usage, latency)
+    return response
+
+async def stream_response(response, messages, accumulator, speculator=None):
+    """Render streamed text deltas into a chat bubble, assembling the full message in
+    `accumulator`"""
+    msg = None
+    try:
+        async for chunk in response:
+            text = accumulator.add(chunk)
+            # Tool calls whose arguments are complete can start while the rest of the message
+            # streams in
+            if speculator and accumulator.tool_calls:
+                speculator.update(accumulator.tool_calls)
+            if not text:
+                continue
+
+            if msg is None:
+                msg = ChatMessage(role="assistant", content="")
+                messages.append(msg)
+            msg.content += text
+            yield messages
+    finally:
+        await close_stream(response)
+
+def speculative_dispatch(app_context, enabled_tools, tool_name, tool_input):
+    """`(generator, timeout)` to start a streamed tool call early, for enabled read-only tools
+    without a cached result"""
+    spec = TOOLS_SPECS.get(tool_name)
+    if spec is None or tool_name not in enabled_tools or spec.get("mutates_state", False):
+        return None
+    # A peek, the regular dispatch does the counted lookup
+    if get_tool_cache_ttl(tool_name, tool_input):
+        if canonical_key(tool_name, tool_input) in tools_cache:
+            return None
+    try:
+        tool_generator = TOOLS_FUNCTIONS[tool_name](app_context, **tool_input)
+    except TypeError:
+        # Bad arguments, left for the regular dispatch to report
+        return None
+    return tool_generator, spec.get("timeout", TOOL_TIMEOUT)
+
+async def discard_speculation(speculator):
+    """Cancel the speculative tool runs the final message didn't call for"""
+    if speculator.runs:
+        logger.info(f"Discarding {len(speculator.runs)} speculative tool runs")
+    await speculator.discard()
+    logger.debug(
+        f"Speculative tools: {speculator.started} started, {speculator.claimed} used, "
+        f"{speculator.discarded} discarded"
+    )
+
+def close_pending_tool_calls(history, reason):
+    """Answer tool calls left without a result (the turn was cancelled mid-tools), so the history
+    stays a valid prompt"""
+    start = len(history) - 1
+    while start >= 0 and history[start]["role"] == "tool":
+        start -= 1
+    if start < 0 or not history[start].get("tool_calls"):
+        return
+    answered = {message["tool_call_id"] for message in history[start + 1:]}
+    for tool_call in history[start]["tool_calls"]:
+        if tool_call["id"] not in answered:
+            history.append({"role": "tool", "tool_call_id": tool_call["id"], "content": reason})
+
+def get_tool_generator(cached_yield, tool_function, app_context, tool_input):
+    """Helper function to either replay the cached result or start the (sync or async) tool
+    generator"""
+    if cached_yield:
+        return iter([cached_yield])
+    return tool_function(app_context, **tool_input)
+
+async def next_update(turn, deadline):
+    """The turn's next chat state, or None once it's over (raises `asyncio.TimeoutError` past
+    the deadline)"""
+    try:
+        return await run_until(turn.__anext__(), deadline)
+    except StopAsyncIteration:
+        return None
+
+def queued_message(position):
+    return ChatMessage(
+        role="assistant",
+        content=f"Position {position} in the queue, your message will be handled shortly.",
+        metadata={"title": "⏳ Queued", "status": "pending"}
+    )
+
+async def chatbot(
+    message, history, model, system_prompt, enabled_tools, max_tokens, temperature, top_p,
+    frequency_penalty, presence_penalty, request: gr.Request = None
+):
+    # Each browser session gets its own history, memory and settings
+    session_id = request.session_hash if request else "default"
+    username = getattr(request, "username", None)
+
+    # Turns wait for a slot, fairly across users, instead of piling onto OpenRouter and
+    # Google Maps
+    scheduler = get_scheduler()
+    ticket = scheduler.enqueue(username or session_id)
+    span = None
+    try:
+        while not ticket.admitted:
+            yield [queued_message(scheduler.position(ticket))], gr.skip()
+            await ticket.wait(QUEUE_STATUS_INTERVAL)
+        # A session missing from memory may have been persisted (by an earlier process, or
+        # before eviction)
+        app_context = await sessions.load(session_id)
+        if username:
+            app_context["owner"] = username
+        span = TurnSpan(model, session_id, queue_seconds=ticket.admitted_at - ticket.enqueued_at)
+        turn = stream_turn(
+            message, session_id, model, system_prompt, enabled_tools, max_tokens, temperature,
+            top_p, frequency_penalty, presence_penalty, span
+        )
+        async for update in turn:
+            yield update
+    finally:
+        # The user's bucket pays for every model request of the turn
+        scheduler.release(ticket, cost=len(span.llm_requests) if span else 1)
+
+async def stream_turn(
+    message, session_id, model, system_prompt, enabled_tools, max_tokens, temperature, top_p,
+    frequency_penalty, presence_penalty, span
+):
+    """Run an admitted turn, turning its chat states into UI updates"""
+    app_context = sessions.get(session_id)
+
+    # Time the UI spends consuming each update counts as render time
+    deadline = time.time() + TURN_TIMEOUT if TURN_TIMEOUT else None
+    turn = run_turn(
+        message, session_id, model, system_prompt, enabled_tools, max_tokens, temperature, top_p,
+        frequency_penalty, presence_penalty, span, deadline
+    )
+
+    # Chat states are coalesced to the UI frame rate, the memory sidebar only re-renders when
+    # memory changed
+    coalescer = UpdateCoalescer(functools.partial(get_memory_markdown, app_context))
+    def memory_version():
+        return id(app_context["system_memory"]), app_context["system_memory"].version
+
+    messages = []
+    upcoming = None
+    try:
+        while True:
+            # The whole turn is bounded, however its time is split between the model and tools
+            try:
+                if coalescer.pending is not None:
+                    # A state is held back: send it if the turn stays quiet until its frame is due
+                    upcoming = upcoming or asyncio.ensure_future(next_update(turn, deadline))
+                    done, _ = await asyncio.wait({upcoming}, timeout=coalescer.wait_time())
+                    if not done:
+                        yield_start = time.time()
+                        yield coalescer.flush()
+                        span.render_seconds += time.time() - yield_start
+                        continue
+                if upcoming is None:
+                    state = await next_update(turn, deadline)
+                else:
+                    state, upcoming = await upcoming, None
+            except asyncio.TimeoutError:
+                logger.warning(f"Turn timed out after {TURN_TIMEOUT:.0f}s")
+                span.error = "timeout"
+                coalescer.pending = None
+                timeout_message = ChatMessage(role="assistant", content=TIMEOUT_MESSAGE)
+                yield messages + [timeout_message], get_memory_markdown(app_context)
+                break
+            if state is None:
+                break
+
+            messages = state
+            update = coalescer.offer(messages, memory_version())
+            if update is None:
+                continue
+            yield_start = time.time()
+            yield update
+            span.render_seconds += time.time() - yield_start
+
+        # The last state always reaches the UI
+        update = coalescer.flush()
+        if update is not None:
+            yield update
+    except (asyncio.CancelledError, GeneratorExit):
+        # The user stopped the turn or went away
+        span.error = span.error or "cancelled"
+        raise
+    finally:
+        if upcoming is not None:
+            upcoming.cancel()
+            await asyncio.gather(upcoming, return_exceptions=True)
+        await turn.aclose()
+        logger.debug(f"UI updates: {coalescer.sent} sent, {coalescer.dropped} coalesced")
+        logger.info("Turn span", extra={"span": span.finish()})
+
+async def run_turn(
+    message, session_id, model, system_prompt, enabled_tools, max_tokens, temperature, top_p,
+    frequency_penalty, presence_penalty, span, deadline=None
+):
+    logger.info(f"New message received: {message[:50]}...")
+
+    app_context = sessions.get(session_id)
+    claude_history = app_context["history"]
+
+    # Update app_context with current settings
+    app_context["model_id"] = model
+    app_context["max_tokens"] = max_tokens
+
+    # Earlier turns' large results shrink to their handle, the model can fetch them if still
+    # relevant
+    if RESULT_STORE_COLLAPSE_OLD_TURNS and "tool_fetch_result" in enabled_tools:
+        collapsed = collapse_stored_results(claude_history)
+        if collapsed:
+            logger.debug(f"Collapsed {collapsed} stored tool results from earlier turns")
+
+    messages = []
+    speculator = None
+    try:
+        claude_history.append({
+            "role": "user",
+            "content": message
+        })
+
+        done = False
+        while not done:
+            done = True
+
+            request_start = time.time()
+            claude_response = await prompt_claude(
+                app_context, system_prompt, enabled_tools, temperature, top_p, frequency_penalty,
+                presence_penalty, stream=STREAM_RESPONSES, span=span
+            )
+            if STREAM_RESPONSES:
+                accumulator = StreamAccumulator()
+                if SPECULATIVE_TOOLS:
+                    dispatch = functools.partial(speculative_dispatch, app_context, enabled_tools)
+                    speculator = ToolSpeculator(dispatch, deadline)
+                updates = stream_response(claude_response, messages, accumulator, speculator)
+                async for update in updates:
+                    yield update
+                choice = accumulator.message()
+                first_turn_request = span.ttft is None
+                span.record_llm(request_start, accumulator.first_token_time, accumulator.usage)
+                if first_turn_request:
+                    logger.info(f"Time to first token: {span.ttft:.3f}s")
+            else:
+                choice = claude_response.choices[0].message
+                span.record_llm(request_start, usage=claude_response.usage)
+
+            # Handle text content (already rendered when streaming)
+            if choice.content and not STREAM_RESPONSES:
+                msg = ChatMessage(
+                    role="assistant",
+                    content=choice.content
+                )
+                messages.append(msg)
+                yield messages
+
+            # Handle tool calls
+            if choice.tool_calls:
+                assistant_msg = {"role": "assistant", "content": choice.content or ""}
+                assistant_msg["tool_calls"] = [
+                    {
+                        "id": tc.id,
+                        "type": "function",
+                        "function": {
+                            "name": tc.function.name,
+                            "arguments": tc.function.arguments
+                        }
+                    }
+                    for tc in choice.tool_calls
+                ]
+                claude_history.append(assistant_msg)
+
+                tool_runs = {}
+                tool_jobs = []
+                for tool_call in choice.tool_calls:
+                    tool_id = tool_call.id
+                    tool_name = tool_call.function.name
+                    tool_input = json.loads(tool_call.function.arguments)
+
+                    # Skip disabled tools
+                    if tool_name not in enabled_tools:
+                        tool_runs[tool_id] = {"error": f"Tool '{tool_name}' is disabled."}
+                        continue
+
+                    tool_key = canonical_key(tool_name, tool_input)
+                    tool_cache_ttl = get_tool_cache_ttl(tool_name, tool_input)
+                    tool_cached_yield = tools_cache.get(tool_key) if tool_cache_ttl else None
+
+                    msg = ChatMessage(
+                        role="assistant",
+                        content="...",
+                        metadata={
+                            "title": f"🛠️ Using tool `{tool_name}`",
+                            "status": "pending"
+                        }
+                    )
+                    messages.append(msg)
+
+                    log_payload(logger, f"Calling {tool_name}", tool_input)
+                    tool_function = TOOLS_FUNCTIONS[tool_name]
+                    # A call started while streaming continues from where it got to
+                    speculative_run = None
+                    if speculator:
+                        arguments = tool_call.function.arguments
+                        speculative_run = speculator.claim(tool_id, tool_name, arguments)
+                    tool_generator = speculative_run or get_tool_generator(
+                        tool_cached_yield, tool_function, app_context, tool_input
+                    )
+                    tool_serialized = TOOLS_SPECS[tool_name].get("mutates_state", False)
+                    tool_timeout = TOOLS_SPECS[tool_name].get("timeout", TOOL_TIMEOUT)
+                    tool_jobs.append((tool_id, tool_generator, tool_serialized, tool_timeout))
+                    tool_runs[tool_id] = {
+                        "name": tool_name,
+                        "input": tool_input,
+                        "key": tool_key,
+                        "cache_ttl": tool_cache_ttl,
+                        "cached": tool_cached_yield is not None,
+                        "msg": msg,
+                        "statuses": [],
+                        "result": None,
+                        "error": False,
+                        "start_time": time.time()
+                    }
+                if speculator:
+                    await discard_speculation(speculator)
+                yield messages
+
+                # Merge status updates from all running tools into their own bubbles
+                tool_events = execute_tools(tool_jobs, deadline=deadline)
+                try:
+                    async for tool_id, tool_yield, tool_exception in tool_events:
+                        tool_run = tool_runs[tool_id]
+                        tool_name = tool_run["name"]
+                        msg = tool_run["msg"]
+                        # None for tools that bypass the cache
+                        tool_cached = tool_run["cached"] if tool_run["cache_ttl"] else None
+
+                        if tool_exception is not None:
+                            tool_run["error"] = str(tool_exception)
+                            duration = time.time() - tool_run["start_time"]
+                            span.record_tool(tool_name, duration, tool_cached, error=True)
+                            msg.metadata["status"] = "done"
+                            msg.content = tool_run["error"]
+                            timed_out = isinstance(tool_exception, ToolTimeout)
+                            if timed_out:
+                                msg.metadata["title"] = f"⏱️ Tool `{tool_name}` timed out"
+                            else:
+                                msg.metadata["title"] = f"💥 Tool `{tool_name}` failed"
+                            yield messages
+                            continue
+
+                        status = tool_yield.get("status")
+                        status_type = tool_yield.get("status_type", "current")
+                        tool_statuses = tool_run["statuses"]
+                        if status_type == "step":
+                            tool_statuses.append(status)
+                        else:
+                            tool_statuses[:] = tool_statuses[:-1] + [status]
+                        msg.content = "\n".join(tool_statuses)
+
+                        if "result" in tool_yield:
+                            tool_run["result"] = tool_yield["result"]
+                            log_payload(logger, f"Tool {tool_name} result", tool_run["result"])
+                            if tool_run["cache_ttl"] and not tool_run["cached"]:
+                                tools_cache.set(
+                                    tool_run["key"], tool_yield, ttl=tool_run["cache_ttl"]
+                                )
+                            duration = time.time() - tool_run["start_time"]
+                            span.record_tool(tool_name, duration, tool_cached)
+                            msg.metadata["status"] = "done"
+                            msg.metadata["duration"] = duration
+                            msg.metadata["title"] = f"🛠️ Used tool `{tool_name}`"
+
+                        yield messages
+                finally:
+                    # Stops tools still running if the turn is cancelled
+                    await tool_events.aclose()
+
+                # Tool results go back to the model in the original call order
+                for tool_call in choice.tool_calls:
+                    tool_run = tool_runs[tool_call.id]
+                    tool_error = tool_run["error"]
+                    if tool_error:
+                        content = str(tool_error)
+                    else:
+                        content = serialize_tool_result(
+                            app_context, enabled_tools,
+                            tool_run["name"], tool_run["input"], tool_run["result"]
+                        )
+                    claude_history.append({
+                        "role": "tool",
+                        "tool_call_id": tool_call.id,
+                        "content": content
+                    })
+                save_app_context(session_id, app_context)
+
+                done = False
+            else:
+                if speculator:
+                    await discard_speculation(speculator)
+                if choice.content:
+                    claude_history.append({
+                        "role": "assistant",
+                        "content": choice.content
+                    })
+        logger.debug(f"Generated response: {messages[-1].content[:50]}...")
+        logger.debug(f"Tools cache: {tools_cache.stats()}")
+        if completion_cache:
+            logger.debug(f"Completion cache: {completion_cache.stats()}")
+        yield messages
+    except Exception as e:
+        logger.error(f"Error processing message: {str(e)}", exc_info=True)
+        span.error = str(e)
+        error_msg = ChatMessage(role="assistant", content=ERROR_MESSAGE)
+        yield messages + [error_msg]
+    finally:
+        if speculator:
+            await speculator.discard()
+        close_pending_tool_calls(
+            claude_history, "Tool call cancelled, the turn was stopped before it finished."
+        )
+        save_app_context(session_id, app_context)
+        sessions.touch(session_id)
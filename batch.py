@@ -0,0 +1,199 @@
+"""Headless batch mode: run scripted conversations from a JSONL file through the agent loop.
+
+Each input line is one conversation:
+
+    {"id": "porto-1", "messages": ["Find cafes near Porto's cathedral", "Which opens earliest?"]}
+
+Besides `messages` (the user turns, sent in order within the same session), a line
+may override any chat setting: `model`, `system_prompt`, `enabled_tools`,
+`max_tokens`, `temperature`, `top_p`, `frequency_penalty` and `presence_penalty`.
+Conversations run concurrently, and each result is written to the output JSONL as
+soon as its conversation finishes:
+
+    python batch.py conversations.jsonl --output results.jsonl --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+# Conversations aren't users to throttle, --concurrency bounds the load
+# (read when the engine is imported)
+os.environ.setdefault("SCHEDULER_USER_REQUESTS_PER_MINUTE", "0")
+# Scripted conversations aren't saved unless asked for explicitly
+os.environ.setdefault("CONVERSATION_STORE_PATH", "")
+
+from agent import (
+    ALL_TOOL_NAMES,
+    AVAILABLE_MODELS,
+    DEFAULT_SYSTEM_PROMPT,
+    ERROR_MESSAGE,
+    TIMEOUT_MESSAGE,
+    chatbot,
+    logger,
+    sessions,
+)
+from utils.scheduler import get_scheduler
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="JSONL file with one conversation per line")
+    parser.add_argument(
+        "--output", "-o", default="-", help="JSONL file for the results (default: stdout)"
+    )
+    parser.add_argument(
+        "--concurrency", "-c", type=int, default=8, help="conversations in flight at once"
+    )
+    parser.add_argument("--limit", type=int, help="only run the first N conversations")
+    parser.add_argument(
+        "--model", default=AVAILABLE_MODELS[0],
+        help="default model for conversations that don't set one"
+    )
+    parser.add_argument("--max-tokens", type=int, default=1024)
+    parser.add_argument("--temperature", type=float, default=1.0)
+    parser.add_argument("--summary-json", help="also write the summary to this file")
+    return parser.parse_args(argv)
+
+def read_conversations(path, limit=None):
+    with open(path) as file:
+        for index, line in enumerate(file):
+            if limit is not None and index >= limit:
+                break
+            if not line.strip():
+                continue
+            conversation = json.loads(line)
+            conversation.setdefault("id", str(index))
+            yield conversation
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))]
+
+async def run_conversation(conversation, args):
+    session_id = f"batch-{conversation['id']}"
+    request = SimpleNamespace(session_hash=session_id)
+    settings = (
+        conversation.get("model", args.model),
+        conversation.get("system_prompt", DEFAULT_SYSTEM_PROMPT),
+        conversation.get("enabled_tools", ALL_TOOL_NAMES),
+        conversation.get("max_tokens", args.max_tokens),
+        conversation.get("temperature", args.temperature),
+        conversation.get("top_p", 1.0),
+        conversation.get("frequency_penalty", 0.0),
+        conversation.get("presence_penalty", 0.0)
+    )
+
+    turns = []
+    try:
+        for message in conversation["messages"]:
+            history = sessions.get(session_id)["history"]
+            history_start = len(history)
+            started_at = time.perf_counter()
+            first_update = None
+            chat_messages = []
+            async for chat_messages, _ in chatbot(message, [], *settings, request=request):
+                if first_update is None:
+                    first_update = time.perf_counter() - started_at
+            latency = time.perf_counter() - started_at
+
+            # What the turn added to the session history: tool calls and the final answer
+            turn_history = history[history_start:]
+            # Failed and timed out turns both end on a canned message instead of an answer
+            last_content = chat_messages[-1].content if chat_messages else None
+            error = last_content in (ERROR_MESSAGE, TIMEOUT_MESSAGE)
+            response = next((
+                entry["content"] for entry in reversed(turn_history)
+                if entry["role"] == "assistant" and not entry.get("tool_calls")
+            ), None)
+            turns.append({
+                "user": message,
+                "response": response,
+                "tool_calls": [
+                    {
+                        "name": tool_call["function"]["name"],
+                        "arguments": json.loads(tool_call["function"]["arguments"])
+                    }
+                    for entry in turn_history if entry.get("tool_calls")
+                    for tool_call in entry["tool_calls"]
+                ],
+                "latency": round(latency, 4),
+                "first_update": round(first_update if first_update is not None else latency, 4),
+                "error": error
+            })
+            if error:
+                break
+    finally:
+        sessions.drop(session_id)
+    return {"id": conversation["id"], "turns": turns}
+
+async def run(conversations, args, output):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    turns = []
+
+    async def bounded(conversation):
+        async with semaphore:
+            result = await run_conversation(conversation, args)
+        turns.extend(result["turns"])
+        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        output.flush()
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(bounded(conversation) for conversation in conversations))
+    return turns, time.perf_counter() - started_at
+
+def summarize(turns, conversations, elapsed):
+    latencies = [turn["latency"] for turn in turns]
+    return {
+        "conversations": conversations,
+        "turns": len(turns),
+        "errors": sum(1 for turn in turns if turn["error"]),
+        "elapsed": round(elapsed, 3),
+        "turns_per_second": round(len(turns) / elapsed, 3) if elapsed else 0.0,
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p90": percentile(latencies, 0.9),
+        "latency_p99": percentile(latencies, 0.99),
+        "latency_max": max(latencies, default=0.0),
+        "first_update_p50": percentile([turn["first_update"] for turn in turns], 0.5)
+    }
+
+def main(argv=None):
+    args = parse_args(argv)
+    conversations = list(read_conversations(args.input, args.limit))
+    # Every conversation in flight gets a slot, turns don't wait behind the global cap
+    scheduler = get_scheduler()
+    scheduler.max_active = max(scheduler.max_active, args.concurrency)
+    logger.info(f"Running {len(conversations)} conversations with concurrency {args.concurrency}")
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        turns, elapsed = asyncio.run(run(conversations, args, output))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    summary = summarize(turns, len(conversations), elapsed)
+    print(
+        f"Conversations   {summary['conversations']} ({summary['turns']} turns, "
+        f"{summary['errors']} errors) in {summary['elapsed']:.2f}s",
+        file=sys.stderr
+    )
+    print(f"Throughput      {summary['turns_per_second']:.2f} turns/s", file=sys.stderr)
+    print(
+        f"Turn latency    p50 {summary['latency_p50']:.3f}s  p90 {summary['latency_p90']:.3f}s  "
+        f"p99 {summary['latency_p99']:.3f}s  max {summary['latency_max']:.3f}s",
+        file=sys.stderr
+    )
+    print(f"First update    p50 {summary['first_update_p50']:.3f}s", file=sys.stderr)
+
+    if args.summary_json:
+        with open(args.summary_json, "w") as file:
+            json.dump(summary, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import threading
+import time
+
+
+class FakeMapsClient:
+    """Offline stand-in for `googlemaps.Client` with configurable latency and payload size.
+
+    Results mimic the shape and bulk of real Places responses (photos, icons,
+    viewports, plus codes) so projection and serialization costs are realistic.
+    """
+
+    def __init__(self, latency=0.15, places=20):
+        self.latency = latency
+        self.places = places
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _sleep(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+
+    def geocode(self, address, **kwargs):
+        self._sleep()
+        return [{
+            "formatted_address": address,
+            "place_id": "ChIJ_bench_geocode",
+            "geometry": {
+                "location": {"lat": 41.1579, "lng": -8.6291},
+                "bounds": {
+                    "northeast": {"lat": 41.1853, "lng": -8.5526},
+                    "southwest": {"lat": 41.1384, "lng": -8.6914}
+                },
+                "viewport": {
+                    "northeast": {"lat": 41.1853, "lng": -8.5526},
+                    "southwest": {"lat": 41.1384, "lng": -8.6914}
+                }
+            },
+            "types": ["locality", "political"]
+        }]
+
+    def places_nearby(self, location=None, type=None, page_token=None, **kwargs):
+        self._sleep()
+        lat, lng = location if location else (41.15, -8.61)
+        results = [self._place(index, lat, lng, type) for index in range(self.places)]
+        return {"results": results, "status": "OK"}
+
+    def place(self, place_id, **kwargs):
+        self._sleep()
+        place = self._place(0, 41.15, -8.61, "restaurant")
+        place.update({
+            "place_id": place_id,
+            "formatted_address": "Rua das Flores 1, 4050-262 Porto, Portugal",
+            "international_phone_number": "+351 22 000 0000",
+            "website": "https://example.com",
+            "reviews": [
+                {
+                    "author_name": f"Reviewer {index}",
+                    "rating": 4,
+                    "text": "Great place. " * 20,
+                    "relative_time_description": "a month ago"
+                }
+                for index in range(5)
+            ]
+        })
+        return {"result": place, "status": "OK"}
+
+    def _place(self, index, lat, lng, type):
+        return {
+            "business_status": "OPERATIONAL",
+            "geometry": {
+                "location": {"lat": lat + index * 0.001, "lng": lng + index * 0.001},
+                "viewport": {
+                    "northeast": {"lat": lat + 0.01, "lng": lng + 0.01},
+                    "southwest": {"lat": lat - 0.01, "lng": lng - 0.01}
+                }
+            },
+            "icon": "https://maps.gstatic.com/mapfiles/place_api/icons/v1/png_71/restaurant-71.png",
+            "icon_background_color": "#FF9E67",
+            "icon_mask_base_uri": (
+                "https://maps.gstatic.com/mapfiles/place_api/icons/v2/restaurant_pinlet"
+            ),
+            "name": f"Bench {type or 'place'} {index}",
+            "opening_hours": {"open_now": index % 3 != 0},
+            "photos": [{
+                "height": 3024,
+                "width": 4032,
+                "html_attributions": [
+                    '<a href="https://maps.google.com/maps/contrib/100000000000000000000">'
+                    "A Photographer</a>"
+                ],
+                "photo_reference": "AUjq9j" + "x" * 300
+            }],
+            "place_id": f"ChIJ_bench_{type}_{index}",
+            "plus_code": {"compound_code": "5C5Q+XX Porto, Portugal", "global_code": "8CHH5C5Q+XX"},
+            "price_level": index % 4,
+            "rating": 4.0 + (index % 10) / 10,
+            "reference": f"ChIJ_bench_{type}_{index}",
+            "scope": "GOOGLE",
+            "types": [type or "point_of_interest", "food", "point_of_interest", "establishment"],
+            "user_ratings_total": 100 + index * 7,
+            "vicinity": f"Rua Bench {index}, Porto"
+        }
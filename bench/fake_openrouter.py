@@ -0,0 +1,238 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.tokens import estimate_tokens
+
+# Benchmark user messages carry a marker so requests can be attributed to a conversation turn
+MARKER_PATTERN = re.compile(r"\[c(\d+) t(\d+)\]")
+
+PLACE_TYPES = ["restaurant", "cafe", "bar", "museum", "park", "bakery", "hotel", "pharmacy"]
+
+class FakeOpenRouter:
+    """Local OpenAI-compatible `/chat/completions` server that scripts a typical tool loop.
+
+    For every user turn the fake model first geocodes an address, then searches
+    nearby places (`fanout` searches in a single assistant message), then answers
+    with `answer_words` words. `ttft` is the delay before the first chunk and
+    `token_delay` the delay between streamed chunks. Every request is recorded
+    with its size so the benchmark can report prompt growth per turn.
+    """
+
+    def __init__(
+        self,
+        ttft=0.2,
+        token_delay=0.01,
+        answer_words=80,
+        fanout=1,
+        repeat=False,
+        host="127.0.0.1",
+        port=0
+    ):
+        self.ttft = ttft
+        self.token_delay = token_delay
+        self.answer_words = answer_words
+        self.fanout = fanout
+        self.repeat = repeat
+        self.records = []
+        self._records_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-openrouter", daemon=True
+        )
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def records_for(self, conversation, turn):
+        with self._records_lock:
+            return [
+                record for record in self.records
+                if record["conversation"] == conversation and record["turn"] == turn
+            ]
+
+    def _record(self, record):
+        with self._records_lock:
+            self.records.append(record)
+
+    def _script(self, messages):
+        """Decide the next assistant message from where the current turn is in the tool loop"""
+        last_user_index = max(
+            index for index, message in enumerate(messages) if message["role"] == "user"
+        )
+        user_message = messages[last_user_index]["content"]
+        match = MARKER_PATTERN.search(user_message)
+        conversation, turn = (int(match.group(1)), int(match.group(2))) if match else (-1, -1)
+        iteration = sum(
+            1 for message in messages[last_user_index:]
+            if message["role"] == "assistant" and message.get("tool_calls")
+        )
+        suffix = "" if self.repeat else f" #{conversation}"
+
+        if iteration == 0:
+            tool_calls = [("tool_geocode", {"address": f"Porto, Portugal{suffix}"})]
+        elif iteration == 1:
+            location = {"latitude": 41.15, "longitude": -8.61}
+            tool_calls = [
+                ("tool_places_nearby", {
+                    "location": location,
+                    "type": PLACE_TYPES[index % len(PLACE_TYPES)],
+                    "radius": 1500,
+                    "keyword": f"{turn}{suffix}".strip()
+                })
+                for index in range(self.fanout)
+            ]
+        else:
+            tool_calls = []
+
+        content = None if tool_calls else " ".join(["lorem"] * self.answer_words)
+        tool_calls = [
+            {
+                "id": f"call_{conversation}_{turn}_{iteration}_{index}",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps(arguments)}
+            }
+            for index, (name, arguments) in enumerate(tool_calls)
+        ]
+        return conversation, turn, iteration, content, tool_calls
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                started_at = time.time()
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                request = json.loads(body)
+                script = fake._script(request["messages"])
+                conversation, turn, iteration, content, tool_calls = script
+                prompt_tokens = estimate_tokens(request["messages"])
+                if request.get("tools"):
+                    prompt_tokens += estimate_tokens(request["tools"])
+                completion_tokens = estimate_tokens(content or json.dumps(tool_calls))
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens
+                }
+
+                # Recorded right before the last bytes go out, so the client never sees a turn
+                # end before its record
+                def record():
+                    fake._record({
+                        "conversation": conversation,
+                        "turn": turn,
+                        "iteration": iteration,
+                        "prompt_bytes": len(body),
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "duration": time.time() - started_at
+                    })
+
+                time.sleep(fake.ttft)
+                if request.get("stream"):
+                    self._stream(request["model"], content, tool_calls, usage, record)
+                else:
+                    self._complete(request["model"], content, tool_calls, usage, record)
+
+            def _complete(self, model, content, tool_calls, usage, record):
+                message = {"role": "assistant", "content": content}
+                if tool_calls:
+                    message["tool_calls"] = tool_calls
+                payload = json.dumps({
+                    "id": "chatcmpl-bench",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": message,
+                        "finish_reason": "tool_calls" if tool_calls else "stop"
+                    }],
+                    "usage": usage
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                record()
+                self.wfile.write(payload)
+
+            def _stream(self, model, content, tool_calls, usage, record):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def send(data):
+                    event = f"data: {data}\n\n".encode("utf-8")
+                    self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+                    self.wfile.flush()
+
+                def chunk(delta, finish_reason=None):
+                    return json.dumps({
+                        "id": "chatcmpl-bench",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+                    })
+
+                if content:
+                    words = content.split(" ")
+                    for start in range(0, len(words), 4):
+                        text = " ".join(words[start:start + 4]) + " "
+                        send(chunk({"role": "assistant", "content": text}))
+                        time.sleep(fake.token_delay)
+
+                for index, tool_call in enumerate(tool_calls):
+                    # Arguments arrive in fragments, like real providers send them
+                    arguments = tool_call["function"]["arguments"]
+                    middle = len(arguments) // 2
+                    send(chunk({"tool_calls": [{
+                        "index": index,
+                        "id": tool_call["id"],
+                        "type": "function",
+                        "function": {
+                            "name": tool_call["function"]["name"], "arguments": arguments[:middle]
+                        }
+                    }]}))
+                    time.sleep(fake.token_delay)
+                    rest = {"index": index, "function": {"arguments": arguments[middle:]}}
+                    send(chunk({"tool_calls": [rest]}))
+                    time.sleep(fake.token_delay)
+
+                send(chunk({}, "tool_calls" if tool_calls else "stop"))
+                send(json.dumps({
+                    "id": "chatcmpl-bench",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [],
+                    "usage": usage
+                }))
+                record()
+                send("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
@@ -0,0 +1,272 @@
+"""Offline benchmark of the agent loop, against a fake OpenRouter server and a fake Google Maps.
+
+Runs scripted conversations end to end through `agent.chatbot()` (real AsyncOpenAI client,
+real HTTP, real tool executor, caches and serializers) with no network access, and reports
+turn latency percentiles, loop overhead per tool-loop iteration (turn time not spent inside
+the model or running tools), prompt size per turn and peak memory. Compare against a saved
+run to catch regressions before deploying:
+
+    python -m bench.run --conversations 50 --turns 3 --concurrency 10 --json bench.json
+    python -m bench.run --conversations 50 --turns 3 --concurrency 10 --baseline bench.json
+"""
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from bench.fake_gmaps import FakeMapsClient
+from bench.fake_openrouter import FakeOpenRouter
+
+# Metrics compared against a baseline run (lower is better for all of them)
+REGRESSION_METRICS = ("latency_p50", "latency_p90", "overhead_p50", "prompt_tokens_p50")
+
+# Seconds the current turn spent running tools, accumulated by `timed_execute_tools`
+turn_tool_seconds = contextvars.ContextVar("turn_tool_seconds")
+
+def timed_execute_tools(execute_tools):
+    """Wrap the engine's tool executor to measure each tool phase of a turn"""
+    async def wrapper(jobs, deadline=None):
+        started_at = time.perf_counter()
+        try:
+            async for event in execute_tools(jobs, deadline=deadline):
+                yield event
+        finally:
+            seconds = turn_tool_seconds.get(None)
+            if seconds is not None:
+                seconds.append(time.perf_counter() - started_at)
+    return wrapper
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=3, help="user turns per conversation")
+    parser.add_argument(
+        "--concurrency", type=int, default=10, help="conversations in flight at once"
+    )
+    parser.add_argument(
+        "--llm-ttft", type=float, default=0.2, help="fake model delay before its first chunk (s)"
+    )
+    parser.add_argument(
+        "--llm-token-delay", type=float, default=0.005, help="fake model delay between chunks (s)"
+    )
+    parser.add_argument("--answer-words", type=int, default=80)
+    parser.add_argument(
+        "--fanout", type=int, default=2, help="parallel place searches per tool-loop iteration"
+    )
+    parser.add_argument(
+        "--maps-latency", type=float, default=0.15, help="fake Google Maps latency per call (s)"
+    )
+    parser.add_argument("--places", type=int, default=20, help="results per fake places search")
+    parser.add_argument(
+        "--repeat", action="store_true",
+        help="identical tool inputs across conversations (exercises caches)"
+    )
+    parser.add_argument("--no-stream", action="store_true", help="disable streamed completions")
+    parser.add_argument(
+        "--trace-memory", action="store_true", help="also report the tracemalloc peak (slower)"
+    )
+    parser.add_argument("--json", help="write the summary to this file")
+    parser.add_argument("--baseline", help="summary JSON of a previous run to compare against")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="allowed relative regression vs the baseline"
+    )
+    return parser.parse_args(argv)
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+async def run_conversation(agent, fake_llm, conversation, args, turns):
+    request = SimpleNamespace(session_hash=f"bench-{conversation}")
+    for turn in range(args.turns):
+        message = f"Find me good places to eat in Porto [c{conversation} t{turn}]"
+        tool_seconds = []
+        turn_tool_seconds.set(tool_seconds)
+        started_at = time.perf_counter()
+        first_update = None
+        settings = (
+            agent.AVAILABLE_MODELS[0], agent.DEFAULT_SYSTEM_PROMPT, agent.ALL_TOOL_NAMES,
+            1024, 0.0, 1.0, 0.0, 0.0
+        )
+        async for _ in agent.chatbot(message, [], *settings, request=request):
+            if first_update is None:
+                first_update = time.perf_counter() - started_at
+        latency = time.perf_counter() - started_at
+
+        records = fake_llm.records_for(conversation, turn)
+        iterations = max(1, len(records))
+        llm_seconds = sum(record["duration"] for record in records)
+        # Whatever isn't spent inside the (fake) model or running tools is our own loop's cost
+        overhead = latency - llm_seconds - sum(tool_seconds)
+        turns.append({
+            "conversation": conversation,
+            "turn": turn,
+            "latency": latency,
+            "first_update": first_update or latency,
+            "iterations": iterations,
+            "llm_seconds": llm_seconds,
+            "tool_seconds": sum(tool_seconds),
+            "overhead_per_iteration": max(0.0, overhead) / iterations,
+            "prompt_bytes": sum(record["prompt_bytes"] for record in records),
+            "prompt_tokens": sum(record["prompt_tokens"] for record in records)
+        })
+
+async def run(agent, fake_llm, args):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    turns = []
+
+    async def bounded(conversation):
+        async with semaphore:
+            await run_conversation(agent, fake_llm, conversation, args, turns)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(bounded(conversation) for conversation in range(args.conversations)))
+    return turns, time.perf_counter() - started_at
+
+def summarize(turns, elapsed, agent, fake_maps, args, traced_peak):
+    latencies = [turn["latency"] for turn in turns]
+    overheads = [turn["overhead_per_iteration"] for turn in turns]
+    summary = {
+        "turns": len(turns),
+        "elapsed": elapsed,
+        "throughput": len(turns) / elapsed if elapsed else 0.0,
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p90": percentile(latencies, 0.9),
+        "latency_p99": percentile(latencies, 0.99),
+        "latency_max": max(latencies, default=0.0),
+        "first_update_p50": percentile([turn["first_update"] for turn in turns], 0.5),
+        "iterations_mean": sum(turn["iterations"] for turn in turns) / len(turns) if turns else 0.0,
+        "llm_seconds_p50": percentile([turn["llm_seconds"] for turn in turns], 0.5),
+        "tool_seconds_p50": percentile([turn["tool_seconds"] for turn in turns], 0.5),
+        "overhead_p50": percentile(overheads, 0.5),
+        "overhead_p90": percentile(overheads, 0.9),
+        "prompt_bytes_p50": percentile([turn["prompt_bytes"] for turn in turns], 0.5),
+        "prompt_bytes_max": max((turn["prompt_bytes"] for turn in turns), default=0),
+        "prompt_tokens_p50": percentile([turn["prompt_tokens"] for turn in turns], 0.5),
+        "prompt_tokens_max": max((turn["prompt_tokens"] for turn in turns), default=0),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "maps_calls": fake_maps.calls,
+        "tools_cache": agent.tools_cache.stats()
+    }
+    if traced_peak is not None:
+        summary["traced_peak_mb"] = traced_peak / (1024 * 1024)
+    if agent.completion_cache:
+        summary["completion_cache"] = agent.completion_cache.stats()
+    return summary
+
+def print_summary(summary, args):
+    streaming = "off" if args.no_stream else "on"
+    print(
+        f"Turns           {summary['turns']} ({args.conversations} conversations x {args.turns}), "
+        f"concurrency {args.concurrency}, streaming {streaming}"
+    )
+    print(f"Throughput      {summary['throughput']:.2f} turns/s over {summary['elapsed']:.2f}s")
+    print(
+        f"Turn latency    p50 {summary['latency_p50']:.3f}s  p90 {summary['latency_p90']:.3f}s  "
+        f"p99 {summary['latency_p99']:.3f}s  max {summary['latency_max']:.3f}s"
+    )
+    print(f"First update    p50 {summary['first_update_p50']:.3f}s")
+    print(
+        f"Time in model   p50 {summary['llm_seconds_p50']:.3f}s  "
+        f"in tools p50 {summary['tool_seconds_p50']:.3f}s per turn"
+    )
+    print(
+        f"Loop overhead   p50 {summary['overhead_p50'] * 1000:.1f}ms  "
+        f"p90 {summary['overhead_p90'] * 1000:.1f}ms per iteration "
+        f"({summary['iterations_mean']:.1f} iterations/turn)"
+    )
+    print(
+        f"Prompt / turn   p50 {summary['prompt_bytes_p50'] / 1024:.1f}KB "
+        f"{summary['prompt_tokens_p50']} tokens  "
+        f"max {summary['prompt_bytes_max'] / 1024:.1f}KB {summary['prompt_tokens_max']} tokens"
+    )
+    memory = f"Peak memory     RSS {summary['peak_rss_mb']:.1f}MB"
+    if "traced_peak_mb" in summary:
+        memory += f"  traced {summary['traced_peak_mb']:.1f}MB"
+    print(memory)
+    print(
+        f"Maps calls      {summary['maps_calls']}  "
+        f"tools cache hit ratio {summary['tools_cache']['hit_ratio']:.2f}"
+    )
+    if "completion_cache" in summary:
+        print(f"Completion cache hit ratio {summary['completion_cache']['hit_ratio']:.2f}")
+
+def compare(summary, baseline, tolerance):
+    """Return the metrics that got worse than the baseline by more than `tolerance`"""
+    regressions = []
+    for metric in REGRESSION_METRICS:
+        before, after = baseline.get(metric), summary.get(metric)
+        if before and after > before * (1 + tolerance):
+            change = (after / before - 1) * 100
+            regressions.append(f"{metric}: {before:.4g} -> {after:.4g} (+{change:.0f}%)")
+    return regressions
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    fake_llm = FakeOpenRouter(
+        ttft=args.llm_ttft,
+        token_delay=args.llm_token_delay,
+        answer_words=args.answer_words,
+        fanout=args.fanout,
+        repeat=args.repeat
+    )
+    fake_maps = FakeMapsClient(latency=args.maps_latency, places=args.places)
+
+    # The engine reads its configuration at import time
+    os.environ["OPENROUTER_API_KEY"] = "bench"
+    os.environ["OPENROUTER_BASE_URL"] = fake_llm.start()
+    os.environ["STREAM_RESPONSES"] = "false" if args.no_stream else "true"
+    # Runs must not warm each other up through persistent caches
+    os.environ["GEOCODE_CACHE_PATH"] = ""
+    os.environ["CONVERSATION_STORE_PATH"] = ""
+    # Scripted conversations aren't users to throttle, and each one in flight gets a slot
+    # (queueing would count as latency)
+    os.environ["SCHEDULER_USER_REQUESTS_PER_MINUTE"] = "0"
+    max_active = int(os.getenv("SCHEDULER_MAX_ACTIVE_TURNS", "32"))
+    os.environ["SCHEDULER_MAX_ACTIVE_TURNS"] = str(max(max_active, args.concurrency))
+
+    import agent
+    from utils.gmaps import set_client
+    set_client(fake_maps)
+    agent.execute_tools = timed_execute_tools(agent.execute_tools)
+    logging.getLogger("botty").setLevel(logging.WARNING)
+
+    if args.trace_memory:
+        tracemalloc.start()
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            turns, elapsed = asyncio.run(run(agent, fake_llm, args))
+    finally:
+        fake_llm.stop()
+    traced_peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+
+    summary = summarize(turns, elapsed, agent, fake_maps, args, traced_peak)
+    print_summary(summary, args)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(summary, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(summary, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
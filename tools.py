@@ -1,7 +1,15 @@
-import os
+import difflib
+
+from utils.geocode_cache import get_geocode_cache
+from utils.gmaps import get_client
+from utils.places_index import PLACES_INDEX, get_places_index
+from utils.prefetch import PLACES_PREFETCH, get_page_prefetcher
+from utils.projection import project
 
 TOOL_SAVE_MEMORY = {
     "name" : "tool_save_memory",
+    "mutates_state": True,
+    "cacheable": False,
     "description": "Used to store information the user requested to remember. Can optionally specify index to overwrite existing memories. Memorized information will be used in system prompt.",
     "input_schema": {
         "type": "object",
@@ -21,14 +29,12 @@ TOOL_SAVE_MEMORY = {
 }
 def tool_save_memory(app_context, memory_data: str, index: int = None):
     system_memory = app_context["system_memory"]
-    system_memory_max_size = app_context["system_memory_max_size"]
 
     if index is not None and index < len(system_memory):
         system_memory[index] = memory_data
         status = f"✅ Updated memory `{index}`: `{memory_data}`."
     else:
         system_memory.append(memory_data)
-        system_memory[:] = system_memory[:system_memory_max_size]
         status = f"✅ Added new memory: `{memory_data}`."
         
     yield {
@@ -39,13 +45,19 @@ def tool_save_memory(app_context, memory_data: str, index: int = None):
 
 TOOL_DELETE_MEMORY = {
     "name": "tool_delete_memory",
+    "mutates_state": True,
+    "cacheable": False,
     "description": "Used to discard information that was previously stored in memory.",
     "input_schema": {
         "type": "object",
         "properties": {
             "memory_index": {
                 "type": "integer",
-                "description": "The index of the memory slot to discard. The system prompt enumerates all memories at all times, prefixed by their memory slot, this is what should be referenced."
+                "description": (
+                    "The index of the memory slot to discard. The system prompt lists the memories "
+                    "(only the most relevant ones when there are many), prefixed by their memory "
+                    "slot, this is what should be referenced."
+                )
             }
         },
         "required": ["memory_index"]
@@ -63,8 +75,121 @@ def tool_delete_memory(app_context, memory_index: int):
     }
 
 
+# Place types supported by the Places API (https://developers.google.com/maps/documentation/places/web-service/place-types)
+PLACE_TYPES = [
+    # Automotive
+    "car_dealer", "car_rental", "car_repair", "car_wash", "electric_vehicle_charging_station", "gas_station", "parking", "rest_stop",
+
+    # Business
+    "corporate_office", "farm", "ranch",
+
+    # Culture
+    "art_gallery", "art_studio", "auditorium", "cultural_landmark", "historical_place", "monument", "museum", "performing_arts_theater", "sculpture",
+
+    # Education
+    "library", "preschool", "primary_school", "school", "secondary_school", "university",
+
+    # Entertainment and Recreation
+    "adventure_sports_center", "amphitheatre", "amusement_center", "amusement_park", "aquarium", "banquet_hall", "barbecue_area", "botanical_garden",
+    "bowling_alley", "casino", "childrens_camp", "comedy_club", "community_center", "concert_hall", "convention_center", "cultural_center",
+    "cycling_park", "dance_hall", "dog_park", "event_venue", "ferris_wheel", "garden", "hiking_area", "historical_landmark", "internet_cafe",
+    "karaoke", "marina", "movie_rental", "movie_theater", "national_park", "night_club", "observation_deck", "off_roading_area", "opera_house",
+    "park", "philharmonic_hall", "picnic_ground", "planetarium", "plaza", "roller_coaster", "skateboard_park", "state_park", "tourist_attraction",
+    "video_arcade", "visitor_center", "water_park", "wedding_venue", "wildlife_park", "wildlife_refuge", "zoo",
+
+    # Facilities
+    "public_bath", "public_bathroom", "stable",
+
+    # Finance
+    "accounting", "atm", "bank",
+
+    # Food and Drink
+    "acai_shop", "afghani_restaurant", "african_restaurant", "american_restaurant", "asian_restaurant", "bagel_shop", "bakery", "bar",
+    "bar_and_grill", "barbecue_restaurant", "brazilian_restaurant", "breakfast_restaurant", "brunch_restaurant", "buffet_restaurant", "cafe",
+    "cafeteria", "candy_store", "cat_cafe", "chinese_restaurant", "chocolate_factory", "chocolate_shop", "coffee_shop", "confectionery",
+    "deli", "dessert_restaurant", "dessert_shop", "diner", "dog_cafe", "donut_shop", "fast_food_restaurant", "fine_dining_restaurant",
+    "food_court", "french_restaurant", "greek_restaurant", "hamburger_restaurant", "ice_cream_shop", "indian_restaurant", "indonesian_restaurant",
+    "italian_restaurant", "japanese_restaurant", "juice_shop", "korean_restaurant", "lebanese_restaurant", "meal_delivery", "meal_takeaway",
+    "mediterranean_restaurant", "mexican_restaurant", "middle_eastern_restaurant", "pizza_restaurant", "pub", "ramen_restaurant", "restaurant",
+    "sandwich_shop", "seafood_restaurant", "spanish_restaurant", "steak_house", "sushi_restaurant", "tea_house", "thai_restaurant",
+    "turkish_restaurant", "vegan_restaurant", "vegetarian_restaurant", "vietnamese_restaurant", "wine_bar",
+
+    # Geographical Areas
+    "administrative_area_level_1", "administrative_area_level_2", "country", "locality", "postal_code", "school_district",
+
+    # Government
+    "city_hall", "courthouse", "embassy", "fire_station", "government_office", "local_government_office", "neighborhood_police_station",
+    "police", "post_office",
+
+    # Health and Wellness
+    "chiropractor", "dental_clinic", "dentist", "doctor", "drugstore", "hospital", "massage", "medical_lab", "pharmacy", "physiotherapist",
+    "sauna", "skin_care_clinic", "spa", "tanning_studio", "wellness_center", "yoga_studio",
+
+    # Housing
+    "apartment_building", "apartment_complex", "condominium_complex", "housing_complex",
+
+    # Lodging
+    "bed_and_breakfast", "budget_japanese_inn", "campground", "camping_cabin", "cottage", "extended_stay_hotel", "farmstay", "guest_house",
+    "hostel", "hotel", "inn", "japanese_inn", "lodging", "mobile_home_park", "motel", "private_guest_room", "resort_hotel", "rv_park",
+
+    # Natural Features
+    "beach",
+
+    # Places of Worship
+    "church", "hindu_temple", "mosque", "synagogue",
+
+    # Services
+    "astrologer", "barber_shop", "beautician", "beauty_salon", "body_art_service", "catering_service", "cemetery", "child_care_agency",
+    "consultant", "courier_service", "electrician", "florist", "food_delivery", "foot_care", "funeral_home", "hair_care", "hair_salon",
+    "insurance_agency", "laundry", "lawyer", "locksmith", "makeup_artist", "moving_company", "nail_salon", "painter", "plumber",
+    "psychic", "real_estate_agency", "roofing_contractor", "storage", "summer_camp_organizer", "tailor", "telecommunications_service_provider",
+    "tour_agency", "tourist_information_center", "travel_agency", "veterinary_care",
+
+    # Shopping
+    "asian_grocery_store", "auto_parts_store", "bicycle_store", "book_store", "butcher_shop", "cell_phone_store", "clothing_store",
+    "convenience_store", "department_store", "discount_store", "electronics_store", "food_store", "furniture_store", "gift_shop",
+    "grocery_store", "hardware_store", "home_goods_store", "home_improvement_store", "jewelry_store", "liquor_store", "market", "pet_store",
+    "shoe_store", "shopping_mall", "sporting_goods_store", "store", "supermarket", "warehouse_store", "wholesaler",
+
+    # Sports
+    "arena", "athletic_field", "fishing_charter", "fishing_pond", "fitness_center", "golf_course", "gym", "ice_skating_rink", "playground",
+    "ski_resort", "sports_activity_location", "sports_club", "sports_coaching", "sports_complex", "stadium", "swimming_pool",
+
+    # Transportation
+    "airport", "airstrip", "bus_station", "bus_stop", "ferry_terminal", "heliport", "international_airport", "light_rail_station",
+    "park_and_ride", "subway_station", "taxi_stand", "train_station", "transit_depot", "transit_station", "truck_stop",
+
+    # Table B Additional Types
+    "administrative_area_level_3", "administrative_area_level_4", "administrative_area_level_5", "administrative_area_level_6",
+    "administrative_area_level_7", "archipelago", "colloquial_area", "continent", "establishment", "finance", "floor", "food",
+    "general_contractor", "geocode", "health", "intersection", "landmark", "natural_feature", "neighborhood", "place_of_worship",
+    "plus_code", "point_of_interest", "political", "post_box", "postal_code_prefix", "postal_code_suffix", "postal_town", "premise",
+    "room", "route", "street_address", "street_number", "sublocality", "sublocality_level_1", "sublocality_level_2", "sublocality_level_3",
+    "sublocality_level_4", "sublocality_level_5", "subpremise", "town_square"
+]
+
+# Opening hours change during the day, everything else is fairly stable
+PLACES_OPEN_NOW_TTL = 5 * 60
+PLACES_TTL = 6 * 60 * 60
+# Google serves at most 3 pages of 20 results per search
+PLACES_MAX_RESULTS = 60
+
 TOOL_PLACES_NEARBY = {
     "name": "tool_places_nearby",
+    "cache_ttl": lambda tool_input: (
+        PLACES_OPEN_NOW_TTL if tool_input.get("open_now") else PLACES_TTL
+    ),
+    # Only what the model needs to pick and describe places
+    # (no photos, icons, viewports, plus codes)
+    "result_fields": [
+        "results.place_id", "results.name", "results.vicinity", "results.types", "results.rating",
+        "results.user_ratings_total", "results.price_level", "results.business_status",
+        "results.opening_hours.open_now", "results.geometry.location", "next_page_token"
+    ],
+    "result_items_key": "results",
+    "result_max_items": 10,
+    # Merging pages waits a couple of seconds per page token
+    "timeout": 60,
     "description": "Search for places using Google Places API with various filtering options",
     "input_schema": {
         "type": "object",
@@ -72,96 +197,10 @@ TOOL_PLACES_NEARBY = {
             "type": {
                 "type": "string",
                 "description": "Type of place to search for",
-                "enum": [
-                    # Automotive
-                    "car_dealer", "car_rental", "car_repair", "car_wash", "electric_vehicle_charging_station", "gas_station", "parking", "rest_stop",
-
-                    # Business
-                    "corporate_office", "farm", "ranch",
-
-                    # Culture
-                    "art_gallery", "art_studio", "auditorium", "cultural_landmark", "historical_place", "monument", "museum", "performing_arts_theater", "sculpture",
-
-                    # Education
-                    "library", "preschool", "primary_school", "school", "secondary_school", "university",
-
-                    # Entertainment and Recreation
-                    "adventure_sports_center", "amphitheatre", "amusement_center", "amusement_park", "aquarium", "banquet_hall", "barbecue_area", "botanical_garden",
-                    "bowling_alley", "casino", "childrens_camp", "comedy_club", "community_center", "concert_hall", "convention_center", "cultural_center",
-                    "cycling_park", "dance_hall", "dog_park", "event_venue", "ferris_wheel", "garden", "hiking_area", "historical_landmark", "internet_cafe",
-                    "karaoke", "marina", "movie_rental", "movie_theater", "national_park", "night_club", "observation_deck", "off_roading_area", "opera_house",
-                    "park", "philharmonic_hall", "picnic_ground", "planetarium", "plaza", "roller_coaster", "skateboard_park", "state_park", "tourist_attraction",
-                    "video_arcade", "visitor_center", "water_park", "wedding_venue", "wildlife_park", "wildlife_refuge", "zoo",
-
-                    # Facilities
-                    "public_bath", "public_bathroom", "stable",
-
-                    # Finance
-                    "accounting", "atm", "bank",
-
-                    # Food and Drink
-                    "acai_shop", "afghani_restaurant", "african_restaurant", "american_restaurant", "asian_restaurant", "bagel_shop", "bakery", "bar",
-                    "bar_and_grill", "barbecue_restaurant", "brazilian_restaurant", "breakfast_restaurant", "brunch_restaurant", "buffet_restaurant", "cafe",
-                    "cafeteria", "candy_store", "cat_cafe", "chinese_restaurant", "chocolate_factory", "chocolate_shop", "coffee_shop", "confectionery",
-                    "deli", "dessert_restaurant", "dessert_shop", "diner", "dog_cafe", "donut_shop", "fast_food_restaurant", "fine_dining_restaurant",
-                    "food_court", "french_restaurant", "greek_restaurant", "hamburger_restaurant", "ice_cream_shop", "indian_restaurant", "indonesian_restaurant",
-                    "italian_restaurant", "japanese_restaurant", "juice_shop", "korean_restaurant", "lebanese_restaurant", "meal_delivery", "meal_takeaway",
-                    "mediterranean_restaurant", "mexican_restaurant", "middle_eastern_restaurant", "pizza_restaurant", "pub", "ramen_restaurant", "restaurant",
-                    "sandwich_shop", "seafood_restaurant", "spanish_restaurant", "steak_house", "sushi_restaurant", "tea_house", "thai_restaurant",
-                    "turkish_restaurant", "vegan_restaurant", "vegetarian_restaurant", "vietnamese_restaurant", "wine_bar",
-
-                    # Geographical Areas
-                    "administrative_area_level_1", "administrative_area_level_2", "country", "locality", "postal_code", "school_district",
-
-                    # Government
-                    "city_hall", "courthouse", "embassy", "fire_station", "government_office", "local_government_office", "neighborhood_police_station",
-                    "police", "post_office",
-
-                    # Health and Wellness
-                    "chiropractor", "dental_clinic", "dentist", "doctor", "drugstore", "hospital", "massage", "medical_lab", "pharmacy", "physiotherapist",
-                    "sauna", "skin_care_clinic", "spa", "tanning_studio", "wellness_center", "yoga_studio",
-
-                    # Housing
-                    "apartment_building", "apartment_complex", "condominium_complex", "housing_complex",
-
-                    # Lodging
-                    "bed_and_breakfast", "budget_japanese_inn", "campground", "camping_cabin", "cottage", "extended_stay_hotel", "farmstay", "guest_house",
-                    "hostel", "hotel", "inn", "japanese_inn", "lodging", "mobile_home_park", "motel", "private_guest_room", "resort_hotel", "rv_park",
-
-                    # Natural Features
-                    "beach",
-
-                    # Places of Worship
-                    "church", "hindu_temple", "mosque", "synagogue",
-
-                    # Services
-                    "astrologer", "barber_shop", "beautician", "beauty_salon", "body_art_service", "catering_service", "cemetery", "child_care_agency",
-                    "consultant", "courier_service", "electrician", "florist", "food_delivery", "foot_care", "funeral_home", "hair_care", "hair_salon",
-                    "insurance_agency", "laundry", "lawyer", "locksmith", "makeup_artist", "moving_company", "nail_salon", "painter", "plumber",
-                    "psychic", "real_estate_agency", "roofing_contractor", "storage", "summer_camp_organizer", "tailor", "telecommunications_service_provider",
-                    "tour_agency", "tourist_information_center", "travel_agency", "veterinary_care",
-
-                    # Shopping
-                    "asian_grocery_store", "auto_parts_store", "bicycle_store", "book_store", "butcher_shop", "cell_phone_store", "clothing_store",
-                    "convenience_store", "department_store", "discount_store", "electronics_store", "food_store", "furniture_store", "gift_shop",
-                    "grocery_store", "hardware_store", "home_goods_store", "home_improvement_store", "jewelry_store", "liquor_store", "market", "pet_store",
-                    "shoe_store", "shopping_mall", "sporting_goods_store", "store", "supermarket", "warehouse_store", "wholesaler",
-
-                    # Sports
-                    "arena", "athletic_field", "fishing_charter", "fishing_pond", "fitness_center", "golf_course", "gym", "ice_skating_rink", "playground",
-                    "ski_resort", "sports_activity_location", "sports_club", "sports_coaching", "sports_complex", "stadium", "swimming_pool",
-
-                    # Transportation
-                    "airport", "airstrip", "bus_station", "bus_stop", "ferry_terminal", "heliport", "international_airport", "light_rail_station",
-                    "park_and_ride", "subway_station", "taxi_stand", "train_station", "transit_depot", "transit_station", "truck_stop",
-
-                    # Table B Additional Types
-                    "administrative_area_level_3", "administrative_area_level_4", "administrative_area_level_5", "administrative_area_level_6",
-                    "administrative_area_level_7", "archipelago", "colloquial_area", "continent", "establishment", "finance", "floor", "food",
-                    "general_contractor", "geocode", "health", "intersection", "landmark", "natural_feature", "neighborhood", "place_of_worship",
-                    "plus_code", "point_of_interest", "political", "post_box", "postal_code_prefix", "postal_code_suffix", "postal_town", "premise",
-                    "room", "route", "street_address", "street_number", "sublocality", "sublocality_level_1", "sublocality_level_2", "sublocality_level_3",
-                    "sublocality_level_4", "sublocality_level_5", "subpremise", "town_square"
+                "enum": PLACE_TYPES,
+                "examples": [
+                    "restaurant", "cafe", "bar", "tourist_attraction",
+                    "museum", "park", "lodging", "supermarket"
                 ]
             },
             "location": {
@@ -214,12 +253,30 @@ TOOL_PLACES_NEARBY = {
             },
             "page_token": {
                 "type": "string",
-                "description": "Token for retrieving the next page of results"
+                "description": (
+                    "Token for retrieving the next page of results "
+                    "(the `next_page_token` of a previous search)"
+                )
+            },
+            "merge_pages": {
+                "type": "boolean",
+                "description": (
+                    "Also fetch the following pages and return all results at once "
+                    "(up to 60 places)"
+                )
             }
         },
         "required": ["location"]
     }
 }
+
+# The index keeps places trimmed to what the model is sent, not Google's full payloads
+# (photos, icons, viewports)
+PLACES_INDEX_FIELDS = [
+    field.split(".", 1)[1] for field in TOOL_PLACES_NEARBY["result_fields"]
+    if field.startswith("results.")
+]
+
 def tool_places_nearby(
     app_context,
     location: dict,
@@ -232,13 +289,26 @@ def tool_places_nearby(
     name: str = None,
     open_now: bool = False,
     rank_by: str = None,
-    page_token: str = None
+    page_token: str = None,
+    merge_pages: bool = False
 ) -> dict:
-    import googlemaps
-    
-    yield {"status" : f"⏳ Searching for locations..."}
-
-    gmaps = googlemaps.Client(key=os.getenv('GOOGLE_MAPS_API_KEY'))
+    # The compact schema doesn't enumerate place types, so correct near misses here
+    status_type = "current"
+    if type is not None and type not in PLACE_TYPES:
+        normalized_type = type.strip().lower().replace(" ", "_").replace("-", "_")
+        matches = difflib.get_close_matches(normalized_type, PLACE_TYPES, n=1, cutoff=0.75)
+        if matches:
+            yield {"status" : f"🔧 Unknown place type `{type}`, using `{matches[0]}`."}
+            type = matches[0]
+        else:
+            yield {"status" : f"🔧 Unknown place type `{type}`, searching it as a keyword."}
+            keyword = f"{keyword} {type}" if keyword else type
+            type = None
+        status_type = "step"
+
+    yield {"status" : "⏳ Searching for locations...", "status_type" : status_type}
+
+    gmaps = get_client()
 
     # Convert location dict to tuple
     location_tuple = (location['latitude'], location['longitude'])
@@ -263,19 +333,67 @@ def tool_places_nearby(
         
     # Remove None values
     params = {k: v for k, v in params.items() if v is not None}
-    
+
+    # Searches inside an area we already fully know are answered locally
+    places_index = get_places_index()
+    indexable = PLACES_INDEX and 'radius' in params and 'page_token' not in params
+    filters = tuple((k, v) for k, v in sorted(params.items()) if k not in ('location', 'radius'))
+    if indexable:
+        max_age = PLACES_OPEN_NOW_TTL if open_now else PLACES_TTL
+        indexed = places_index.lookup(
+            filters, location['latitude'], location['longitude'], params['radius'], max_age
+        )
+        if indexed is not None:
+            locations, age = indexed
+            yield {
+                "status" : (
+                    f"✅ Found `{len(locations)}` locations (local index, {age / 60:.0f} min old)."
+                ),
+                "result" : {"results": locations}
+            }
+            return
+
+    # Later pages may already have been prefetched (Google ignores the other params with a token)
+    prefetcher = get_page_prefetcher()
+    def fetch_page(token): return gmaps.places_nearby(page_token=token)
+
     # Make the API call
-    result = gmaps.places_nearby(**params)
+    result = prefetcher.get(page_token, fetch_page) if page_token else gmaps.places_nearby(**params)
     locations = result.get('results', [])
-
+    next_page_token = result.get('next_page_token')
+
+    while merge_pages and next_page_token and len(locations) < PLACES_MAX_RESULTS:
+        yield {"status" : f"⏳ Found `{len(locations)}` locations, fetching more..."}
+        result = prefetcher.get(next_page_token, fetch_page)
+        locations = locations + result.get('results', [])
+        next_page_token = result.get('next_page_token')
+
+    # Without a next page Google returned every match, so the region can answer smaller
+    # searches inside it
+    if indexable:
+        complete = next_page_token is None and len(locations) < PLACES_MAX_RESULTS
+        places_index.add(
+            filters, location['latitude'], location['longitude'], params['radius'],
+            project(locations, PLACES_INDEX_FIELDS), complete=complete
+        )
+
+    # Have the next page ready (tokens only become valid after a short delay) by the time
+    # it's asked for
+    if PLACES_PREFETCH and next_page_token:
+        prefetcher.prefetch(next_page_token, fetch_page)
+
+    result = {"results": locations}
+    if next_page_token:
+        result["next_page_token"] = next_page_token
     yield {
         "status" : f"✅ Found `{len(locations)}` locations.", 
-        "result" : locations
+        "result" : result
     }
 
 
 TOOL_CALCULATOR = {
     "name": "tool_calculator",
+    "cache_ttl": 24 * 60 * 60,
     "description": "Perform mathematical operations with error handling and precision tracking",
     "input_schema": {
         "type": "object",
@@ -311,6 +429,7 @@ def tool_calculator(app_context, first_number, second_number, operation: str):
 
 TOOL_GEOCODE = {
     "name": "tool_geocode",
+    "cache_ttl": 30 * 24 * 60 * 60,
     "description": "Convert addresses into latitude and longitude coordinates using Google Geocoding API",
     "input_schema": {
         "type": "object",
@@ -345,12 +464,22 @@ def tool_geocode(app_context, address: str) -> dict:
 
         return distance
 
-    import googlemaps
-    
+    # Spellings of the same address share one (persistent) entry, areas rarely move
+    geocode_cache = get_geocode_cache()
+    cached = geocode_cache.get(address)
+    if cached is not None:
+        yield {
+            "status" : (
+                f"✅ Geocoded `{address}` to center=`({cached['center']['lat']},"
+                f"{cached['center']['lng']}), radius={cached['radius']}m` (cached)."
+            ),
+            "result" : cached
+        }
+        return
+
     yield {"status" : f"⏳ Geocoding '{address}'..."}
 
-    # TODO: reuse gmaps client
-    gmaps = googlemaps.Client(key=os.getenv('GOOGLE_MAPS_API_KEY'))
+    gmaps = get_client()
     
     result = gmaps.geocode(address)
 
@@ -372,17 +501,29 @@ def tool_geocode(app_context, address: str) -> dict:
     # Calculate the radius of the bounding box
     radius = _haversine(center_lat, center_lng, northeast['lat'], northeast['lng']) * 1000
 
+    geocoded = {
+        "center": center,
+        "radius" : radius
+    }
+    geocode_cache.set(address, geocoded)
+
     yield {
         "status" : f"✅ Geocoded `{address}` to center=`({center_lat},{center_lng}), radius={radius}m`.",
-        "result" : {
-            "center": center,
-            "radius" : radius
-        }
+        "result" : geocoded
     }
 
 
 TOOL_PLACE_DETAILS = {
     "name": "tool_place_details",
+    "cache_ttl": 24 * 60 * 60,
+    # When the model asks for specific fields it gets them untouched
+    "result_fields": lambda tool_input: None if tool_input.get("fields") else [
+        "place_id", "name", "formatted_address", "international_phone_number", "website", "url",
+        "types", "rating", "user_ratings_total", "price_level", "business_status",
+        "opening_hours.open_now", "opening_hours.weekday_text", "geometry.location",
+        "editorial_summary.overview", "reviews.rating", "reviews.text",
+        "reviews.relative_time_description"
+    ],
     "description": "Get detailed information about a specific place using its place_id from Google Places API",
     "input_schema": {
         "type": "object",
@@ -416,11 +557,9 @@ TOOL_PLACE_DETAILS = {
     }
 }
 def tool_place_details(app_context, place_id: str, language: str = None, fields: list = None) -> dict:
-    import googlemaps
-    
-    yield {"status" : f"⏳ Looking up details on location..."}
+    yield {"status" : "⏳ Looking up details on location..."}
 
-    gmaps = googlemaps.Client(key=os.getenv('GOOGLE_MAPS_API_KEY'))
+    gmaps = get_client()
     
     params = {'place_id': place_id}
     if language: params['language'] = language
@@ -430,18 +569,74 @@ def tool_place_details(app_context, place_id: str, language: str = None, fields:
     details = result.get('result', {})
 
     yield {
-        "status" : f"✅ Location details fetched.",
+        "status" : "✅ Location details fetched.",
         "result" : details
     }
         
 
+TOOL_FETCH_RESULT = {
+    "name": "tool_fetch_result",
+    "cacheable": False,
+    # Returns exactly what was asked for, already stored results are never stored again
+    "result_max_items": None,
+    "result_store": False,
+    "description": (
+        "Read more of a large tool result that was summarized: results with a `result_handle` "
+        "only include some items and fields (listed in `omitted`). Fetch specific fields and/or "
+        "a slice of items by handle instead of calling the original tool again."
+    ),
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "handle": {
+                "type": "string",
+                "description": "The `result_handle` of the stored result (e.g. 'r3')"
+            },
+            "fields": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": (
+                    "Fields to return, dotted paths apply to every item "
+                    "(e.g. ['name', 'opening_hours.weekday_text']). Omit to return whole items."
+                )
+            },
+            "start": {
+                "type": "integer",
+                "minimum": 0,
+                "description": "For list results, index of the first item to return"
+            },
+            "end": {
+                "type": "integer",
+                "minimum": 0,
+                "description": "For list results, index after the last item to return"
+            }
+        },
+        "required": ["handle"]
+    }
+}
+def tool_fetch_result(
+    app_context, handle: str, fields: list = None, start: int = None, end: int = None
+):
+    fetched = app_context["tool_results"].fetch(handle, fields, start, end)
+    if fetched is None:
+        raise ValueError(
+            f"No stored result `{handle}` (unknown or expired), call the original tool again."
+        )
+
+    yield {
+        "status" : f"✅ Fetched result `{handle}`.",
+        "result" : fetched
+    }
+
+
 TOOLS = (
     (TOOL_SAVE_MEMORY, tool_save_memory),
     (TOOL_DELETE_MEMORY, tool_delete_memory),
     (TOOL_CALCULATOR, tool_calculator),
     (TOOL_PLACES_NEARBY, tool_places_nearby),
     (TOOL_GEOCODE, tool_geocode),
-    (TOOL_PLACE_DETAILS, tool_place_details)
+    (TOOL_PLACE_DETAILS, tool_place_details),
+    (TOOL_FETCH_RESULT, tool_fetch_result)
 )
 
 TOOLS_SPECS = {tool[0]["name"]: tool[0] for tool in TOOLS}
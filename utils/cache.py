@@ -0,0 +1,107 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def canonical_key(name, params):
+    """Stable cache key: argument order and whitespace don't matter"""
+    return f"{name}:{json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)}"
+
+def _estimate_size(value):
+    return len(json.dumps(value, default=str))
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by entry count and total size, with per-entry TTLs.
+
+    Entries past their TTL are treated as misses and dropped on access. When the
+    cache is over `max_entries` or `max_bytes`, the least recently used entries
+    are evicted. Hit/miss/eviction counters are available through `stats()`.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, default_ttl=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires_at, size = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None, size=None):
+        ttl = ttl if ttl is not None else self.default_ttl
+        size = size if size is not None else _estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            expires_at = time.time() + ttl if ttl is not None else None
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def __contains__(self, key):
+        """Whether `key` holds a live entry, without counting a lookup or refreshing its recency"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (entry[1] is None or entry[1] > time.time())
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            value = self._entries[key][0]
+            self._remove(key)
+            return value
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
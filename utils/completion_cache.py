@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+from utils.cache import LRUCache
+from utils.sqlite_kv import SQLiteKV
+from utils.streaming import StreamAccumulator, close_stream
+
+# Request fields that determine the completion (anything else doesn't go in the key)
+KEY_FIELDS = (
+    "model", "messages", "tools", "max_tokens",
+    "temperature", "top_p", "frequency_penalty", "presence_penalty"
+)
+
+def _usage_dict(usage):
+    if usage is None:
+        return None
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0
+    }
+
+def _message_dict(message):
+    return {
+        "content": message.content,
+        "tool_calls": [
+            {"name": tool_call.function.name, "arguments": tool_call.function.arguments}
+            for tool_call in message.tool_calls or []
+        ]
+    }
+
+def _normalize_tool_call_ids(messages):
+    """Replace tool call ids (random per response) by their order of appearance"""
+    ids = {}
+    def normalize(tool_call_id): return ids.setdefault(tool_call_id, f"call_{len(ids)}")
+
+    normalized = []
+    for message in messages:
+        if message.get("tool_calls"):
+            tool_calls = [
+                dict(tool_call, id=normalize(tool_call["id"]))
+                for tool_call in message["tool_calls"]
+            ]
+            message = dict(message, tool_calls=tool_calls)
+        if message.get("tool_call_id"):
+            message = dict(message, tool_call_id=normalize(message["tool_call_id"]))
+        normalized.append(message)
+    return normalized
+
+def _replay_tool_calls(entry):
+    # Fresh ids so a replayed call never clashes with one already in the history
+    return [
+        SimpleNamespace(
+            id=f"call_{uuid.uuid4().hex[:24]}",
+            type="function",
+            function=SimpleNamespace(name=tool_call["name"], arguments=tool_call["arguments"])
+        )
+        for tool_call in entry["message"]["tool_calls"]
+    ]
+
+def _usage(entry):
+    return SimpleNamespace(**entry["usage"]) if entry.get("usage") else None
+
+class CompletionCache:
+    """Exact-match cache for deterministic (temperature 0) chat completions.
+
+    Keyed on a hash of the canonical request (model, messages, tools and sampling
+    parameters). Entries live in an in-memory LRU and, when `path` is set, in an
+    SQLite file so they survive restarts (read off the event loop, written in the
+    background). Hits are replayed as regular responses (or streams), so callers
+    can't tell them apart from the real thing.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=None, path=None):
+        self.memory = LRUCache(max_entries=max_entries, max_bytes=max_bytes, default_ttl=ttl)
+        self.ttl = ttl
+        self.path = path
+        self.disk = SQLiteKV(path, "completions", ttl=ttl) if path else None
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.saved_prompt_tokens = 0
+        self.saved_completion_tokens = 0
+
+    @staticmethod
+    def is_cacheable(request):
+        return request.get("temperature") == 0 and request.get("n", 1) == 1
+
+    @staticmethod
+    def key(request):
+        fields = {field: request.get(field) for field in KEY_FIELDS}
+        fields["messages"] = _normalize_tool_call_ids(fields["messages"] or [])
+        canonical = json.dumps(fields, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    async def get(self, key):
+        entry = self.memory.get(key)
+        if entry is None and self.disk:
+            entry = await asyncio.to_thread(self.disk.get, key)
+            if entry is not None:
+                self.memory.set(key, entry)
+
+        with self._stats_lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.saved_seconds += entry["latency"]
+            if entry.get("usage"):
+                self.saved_prompt_tokens += entry["usage"]["prompt_tokens"]
+                self.saved_completion_tokens += entry["usage"]["completion_tokens"]
+        return entry
+
+    def set(self, key, message, usage, latency):
+        entry = {
+            "message": _message_dict(message),
+            "usage": _usage_dict(usage),
+            "latency": latency,
+            "created_at": time.time()
+        }
+        self.memory.set(key, entry)
+        if self.disk:
+            self.disk.set(key, entry, created_at=entry["created_at"])
+
+    def replay_response(self, entry):
+        """A non-streamed response object equivalent to the cached one"""
+        message = SimpleNamespace(
+            content=entry["message"]["content"], tool_calls=_replay_tool_calls(entry) or None
+        )
+        choice = SimpleNamespace(message=message, finish_reason="stop")
+        return SimpleNamespace(choices=[choice], usage=_usage(entry))
+
+    async def replay_stream(self, entry):
+        """A stream of chunks equivalent to the cached response, all delivered at once"""
+        tool_calls = [
+            SimpleNamespace(index=index, id=tool_call.id, function=tool_call.function)
+            for index, tool_call in enumerate(_replay_tool_calls(entry))
+        ]
+        delta = SimpleNamespace(content=entry["message"]["content"], tool_calls=tool_calls or None)
+        choice = SimpleNamespace(delta=delta, finish_reason="tool_calls" if tool_calls else "stop")
+        yield SimpleNamespace(choices=[choice], usage=_usage(entry))
+
+    async def record_stream(self, key, stream, started_at):
+        """Pass a live stream through, caching the assembled message once it completes"""
+        accumulator = StreamAccumulator()
+        try:
+            async for chunk in stream:
+                accumulator.add(chunk)
+                yield chunk
+        finally:
+            # An abandoned stream (turn cancelled or timed out) is closed and not cached
+            await close_stream(stream)
+        self.set(key, accumulator.message(), accumulator.usage, time.time() - started_at)
+
+    def stats(self):
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "saved_prompt_tokens": self.saved_prompt_tokens,
+                "saved_completion_tokens": self.saved_completion_tokens,
+                "memory": self.memory.stats()
+            }
@@ -0,0 +1,122 @@
+import os
+
+from utils.tokens import estimate_tokens
+
+# Hard cap on prompt size regardless of how large the model's window is (keeps latency bounded)
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "32000"))
+CONTEXT_DEFAULT_WINDOW = 8192
+
+MODEL_CONTEXT_WINDOWS = {
+    "anthropic/claude-3.5-sonnet": 200000,
+    "anthropic/claude-3-opus": 200000,
+    "anthropic/claude-3-haiku": 200000,
+    "openai/gpt-4-turbo": 128000,
+    "openai/gpt-4": 8192,
+    "openai/gpt-3.5-turbo": 16385,
+    "google/gemini-pro-1.5": 1000000,
+    "meta-llama/llama-3.1-70b-instruct": 131072,
+    "mistralai/mistral-large": 128000,
+}
+
+OMITTED_TOOL_RESULT = "[Tool result omitted to save context, call the tool again if needed]"
+SUMMARY_MAX_LINES = 10
+
+# Per-message framing overhead (role, separators) added by chat templates
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def get_token_budget(model_id, max_tokens, reserved_tokens=0):
+    """Prompt tokens we allow for a model: its window minus the completion, capped by
+    CONTEXT_MAX_TOKENS"""
+    window = MODEL_CONTEXT_WINDOWS.get(model_id, CONTEXT_DEFAULT_WINDOW)
+    return max(0, min(window - max_tokens, CONTEXT_MAX_TOKENS) - reserved_tokens)
+
+def count_message_tokens(message):
+    tokens = MESSAGE_OVERHEAD_TOKENS + estimate_tokens(message.get("content") or "")
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call["function"]
+        tokens += estimate_tokens(function["name"]) + estimate_tokens(function["arguments"])
+    return tokens
+
+def _split_turns(history):
+    """Group history into turns, each starting at a user message, so tool_call/tool pairs
+    never split"""
+    turns = []
+    for message in history:
+        if message["role"] == "user" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+def _summarize(turns):
+    """One line per dropped turn, built from the user's request"""
+    lines = []
+    for turn in turns:
+        request = next(
+            (message.get("content") or "" for message in turn if message["role"] == "user"), ""
+        )
+        if request:
+            lines.append(f"- {' '.join(request.split())[:100]}")
+    if len(lines) > SUMMARY_MAX_LINES:
+        lines = [f"- ({len(lines) - SUMMARY_MAX_LINES} more)"] + lines[-SUMMARY_MAX_LINES:]
+    return "\n".join(lines)
+
+def fit_messages(system_message, history, budget):
+    """Build `[system] + history` trimmed to fit in `budget` tokens, without mutating `history`.
+
+    First the bodies of old tool results are replaced by a placeholder (oldest first),
+    then whole old turns are evicted and summarized in the system message. Last, the
+    current turn's tool results from earlier tool-loop iterations are replaced too; its
+    latest iteration is always kept intact, so the result may still exceed `budget`.
+    Returns the messages and a dict of trimming stats.
+    """
+    turns = [[dict(message) for message in turn] for turn in _split_turns(history)]
+    counts = [[count_message_tokens(message) for message in turn] for turn in turns]
+    system_tokens = count_message_tokens(system_message)
+    total = system_tokens + sum(sum(turn_counts) for turn_counts in counts)
+    stats = {"tokens_before": total, "tool_results_dropped": 0, "turns_evicted": 0}
+
+    def drop_tool_results(turn, turn_counts, end):
+        # Replace tool result bodies in `turn[:end]`, oldest first, until within budget
+        nonlocal total
+        for index, message in enumerate(turn[:end]):
+            if total <= budget:
+                break
+            if message["role"] != "tool" or message["content"] == OMITTED_TOOL_RESULT:
+                continue
+            message["content"] = OMITTED_TOOL_RESULT
+            new_count = count_message_tokens(message)
+            total -= turn_counts[index] - new_count
+            turn_counts[index] = new_count
+            stats["tool_results_dropped"] += 1
+
+    # Drop old tool result bodies first, they are the bulk of the context
+    for turn, turn_counts in zip(turns[:-1], counts[:-1]):
+        drop_tool_results(turn, turn_counts, len(turn))
+
+    # Then evict whole turns, oldest first, keeping the current one
+    evicted = []
+    while total > budget and len(turns) > 1:
+        evicted.append(turns.pop(0))
+        total -= sum(counts.pop(0))
+    stats["turns_evicted"] = len(evicted)
+
+    # A long tool loop can outgrow the budget on its own: keep only its latest iteration's results
+    if total > budget and turns:
+        current, current_counts = turns[-1], counts[-1]
+        last_call = max(
+            (index for index, message in enumerate(current) if message.get("tool_calls")), default=0
+        )
+        drop_tool_results(current, current_counts, last_call)
+
+    if evicted:
+        system_message = dict(system_message)
+        summary = (
+            "Earlier parts of this conversation were dropped to save context. "
+            f"The user had asked:\n{_summarize(evicted)}"
+        )
+        system_message["content"] = f"{system_message['content']}\n\n{summary}"
+        total += count_message_tokens(system_message) - system_tokens
+
+    stats["tokens_after"] = total
+    messages = [system_message] + [message for turn in turns for message in turn]
+    return messages, stats
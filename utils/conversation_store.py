@@ -0,0 +1,227 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+# SQLite file holding sessions, messages and memories (empty keeps conversations in memory only)
+CONVERSATION_STORE_PATH = os.getenv("CONVERSATION_STORE_PATH", "")
+# Messages loaded back when a session resumes (older ones stay on disk)
+CONVERSATION_RESUME_MESSAGES = int(os.getenv("CONVERSATION_RESUME_MESSAGES", "200"))
+# Seconds writes may wait to be batched into one transaction
+CONVERSATION_FLUSH_INTERVAL = float(os.getenv("CONVERSATION_FLUSH_INTERVAL", "0.2"))
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, owner TEXT, model_id TEXT, "
+    "max_tokens INTEGER, created_at REAL NOT NULL, updated_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS messages (session_id TEXT NOT NULL, seq INTEGER NOT NULL, "
+    "message TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (session_id, seq))",
+    "CREATE TABLE IF NOT EXISTS memories (session_id TEXT NOT NULL, position INTEGER NOT NULL, "
+    "memory TEXT NOT NULL, PRIMARY KEY (session_id, position))"
+)
+
+_store = None
+_store_lock = threading.Lock()
+
+def new_persisted_state():
+    """Bookkeeping of what part of a session is already on disk"""
+    return {"messages": 0, "next_seq": 0, "memory_version": 0}
+
+class ConversationStore:
+    """Sessions, their messages and memories in an SQLite file (WAL mode), shared by workers.
+
+    Messages are append-only: `save()` queues the ones added since the last save,
+    numbered by their position in the whole conversation, and memories are
+    rewritten when they changed. A writer thread commits queued writes in batches,
+    so saving never waits on the disk. `load()` brings back a session with its
+    memories and only its most recent messages (starting at a user message).
+    A session should be served by one process at a time (sticky sessions).
+    """
+
+    def __init__(
+        self,
+        path=CONVERSATION_STORE_PATH,
+        resume_messages=CONVERSATION_RESUME_MESSAGES,
+        flush_interval=CONVERSATION_FLUSH_INTERVAL
+    ):
+        self.path = path
+        self.resume_messages = resume_messages
+        self.flush_interval = flush_interval
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._pending = {}
+        self._pending_done = threading.Condition()
+        self._writer = threading.Thread(
+            target=self._write_loop, name="conversation-store", daemon=True
+        )
+        self._writer.start()
+        self._stats_lock = threading.Lock()
+        self.saved_messages = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.loads = 0
+        atexit.register(self.close)
+
+    def save(self, session_id, app_context):
+        """Queue the session's new messages, changed memories and settings for writing"""
+        persisted = app_context.setdefault("persisted", new_persisted_state())
+        history = app_context["history"]
+        now = time.time()
+
+        new_messages = history[persisted["messages"]:]
+        rows = [
+            (session_id, persisted["next_seq"] + offset, json.dumps(message, default=str), now)
+            for offset, message in enumerate(new_messages)
+        ]
+        persisted["messages"] = len(history)
+        persisted["next_seq"] += len(rows)
+
+        memory = app_context["system_memory"]
+        memories = None
+        if memory.version != persisted["memory_version"]:
+            memories = [str(item) for item in memory]
+            persisted["memory_version"] = memory.version
+
+        with self._pending_done:
+            self._pending[session_id] = self._pending.get(session_id, 0) + 1
+        settings = (app_context.get("owner"), app_context["model_id"], app_context["max_tokens"])
+        self._queue.put((session_id, *settings, rows, memories, now))
+
+    def load(self, session_id):
+        """The saved state of a session (`model_id`, `max_tokens`, `history`, `memories` and the
+        `persisted` bookkeeping, short of the memory version), or None"""
+        # A session evicted with writes still queued waits for them (only its own)
+        with self._pending_done:
+            self._pending_done.wait_for(lambda: session_id not in self._pending)
+        with self._db_lock:
+            db = self._connect()
+            session = db.execute(
+                "SELECT model_id, max_tokens FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            if session is None:
+                return None
+            rows = db.execute(
+                "SELECT seq, message FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+                (session_id, self.resume_messages)
+            ).fetchall()
+            memories = [row[0] for row in db.execute(
+                "SELECT memory FROM memories WHERE session_id = ? ORDER BY position", (session_id,)
+            )]
+
+        rows.reverse()
+        next_seq = rows[-1][0] + 1 if rows else 0
+        history = [json.loads(message) for _, message in rows]
+        # Resume at a turn boundary, a tool result without its call isn't a valid prompt
+        start = next(
+            (index for index, message in enumerate(history) if message["role"] == "user"),
+            len(history)
+        )
+        history = history[start:]
+
+        with self._stats_lock:
+            self.loads += 1
+        return {
+            "model_id": session[0],
+            "max_tokens": session[1],
+            "history": history,
+            "memories": memories,
+            "persisted": {"messages": len(history), "next_seq": next_seq}
+        }
+
+    def flush(self):
+        """Wait until everything queued so far is written"""
+        self._queue.join()
+
+    def close(self):
+        self.flush()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "saved_messages": self.saved_messages,
+                "batches": self.batches,
+                "failed_batches": self.failed_batches,
+                "loads": self.loads,
+                "pending": self._queue.qsize()
+            }
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            for statement in SCHEMA:
+                self._db.execute(statement)
+        return self._db
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            # Whatever else arrives within the flush interval goes into the same transaction
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception:
+                # Persistence is best effort, a failed batch must not stop the writer
+                # (it shows in the stats)
+                with self._stats_lock:
+                    self.failed_batches += 1
+            finally:
+                with self._pending_done:
+                    for item in batch:
+                        self._pending[item[0]] -= 1
+                        if not self._pending[item[0]]:
+                            del self._pending[item[0]]
+                    self._pending_done.notify_all()
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        with self._db_lock:
+            db = self._connect()
+            with db:
+                for session_id, owner, model_id, max_tokens, rows, memories, now in batch:
+                    db.execute(
+                        "INSERT INTO sessions "
+                        "(id, owner, model_id, max_tokens, created_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET "
+                        "owner = COALESCE(excluded.owner, owner), model_id = excluded.model_id, "
+                        "max_tokens = excluded.max_tokens, updated_at = excluded.updated_at",
+                        (session_id, owner, model_id, max_tokens, now, now)
+                    )
+                    db.executemany(
+                        "INSERT OR REPLACE INTO messages (session_id, seq, message, created_at) "
+                        "VALUES (?, ?, ?, ?)",
+                        rows
+                    )
+                    if memories is not None:
+                        db.execute("DELETE FROM memories WHERE session_id = ?", (session_id,))
+                        db.executemany(
+                            "INSERT INTO memories (session_id, position, memory) VALUES (?, ?, ?)",
+                            [
+                                (session_id, position, memory)
+                                for position, memory in enumerate(memories)
+                            ]
+                        )
+        with self._stats_lock:
+            self.saved_messages += sum(len(item[4]) for item in batch)
+            self.batches += 1
+
+def get_conversation_store():
+    """Process-wide conversation store, or None when persistence is disabled"""
+    global _store
+    if not CONVERSATION_STORE_PATH:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = ConversationStore()
+        return _store
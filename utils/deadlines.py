@@ -0,0 +1,132 @@
+import asyncio
+import contextlib
+import os
+import threading
+import time
+
+# Seconds a single tool call may run (tools may override it with a `timeout` spec key)
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "30"))
+# Seconds a whole turn (every model request and tool call) may take
+TURN_TIMEOUT = float(os.getenv("TURN_TIMEOUT", "180"))
+
+_local = threading.local()
+
+class ToolTimeout(Exception):
+    pass
+
+class ToolCancelled(Exception):
+    pass
+
+class CancelScope:
+    """Deadline and cancellation flag of one tool call, checked cooperatively by the code it runs.
+
+    The scope is made current on the thread running the tool, so blocking helpers
+    (the Maps client, its HTTP adapter) can bound their waits by `remaining()` and
+    bail out with `check()` once the call timed out or was cancelled.
+    """
+
+    def __init__(self, timeout=None, deadline=None):
+        timeout_deadline = time.time() + timeout if timeout else None
+        deadlines = [d for d in (deadline, timeout_deadline) if d is not None]
+        self.timeout = timeout
+        self.deadline = min(deadlines) if deadlines else None
+        self.reason = None
+        self._event = threading.Event()
+
+    def cancel(self, reason="cancelled"):
+        if self.reason is None:
+            self.reason = reason
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        if not self._event.is_set() and self.deadline is not None and time.time() >= self.deadline:
+            self.cancel("timeout")
+        return self._event.is_set()
+
+    def remaining(self):
+        return None if self.deadline is None else max(0.0, self.deadline - time.time())
+
+    def error(self):
+        if self.reason == "timeout":
+            if self.timeout:
+                return ToolTimeout(f"Tool timed out after {self.timeout:.0f}s.")
+            return ToolTimeout("Tool ran out of time for this turn.")
+        return ToolCancelled("Tool call was cancelled.")
+
+    def check(self):
+        """Raise if the call timed out or was cancelled"""
+        if self.cancelled:
+            raise self.error()
+
+    def sleep(self, seconds):
+        """Sleep that wakes up (and raises) as soon as the scope is cancelled"""
+        remaining = self.remaining()
+        self._event.wait(seconds if remaining is None else min(seconds, remaining))
+        self.check()
+
+def current_scope():
+    return getattr(_local, "scope", None)
+
+@contextlib.contextmanager
+def active_scope(scope):
+    """Make `scope` current on this thread while running a tool"""
+    previous = current_scope()
+    _local.scope = scope
+    try:
+        yield scope
+    finally:
+        _local.scope = previous
+
+def sleep(seconds):
+    """`time.sleep` that honors the current scope, if any"""
+    scope = current_scope()
+    if scope is None:
+        time.sleep(seconds)
+    else:
+        scope.sleep(seconds)
+
+def clamp_timeout(timeout):
+    """Bound an HTTP timeout (seconds or a `(connect, read)` tuple) by the current scope's
+    remaining time"""
+    scope = current_scope()
+    if scope is None:
+        return timeout
+    scope.check()
+    remaining = scope.remaining()
+    if remaining is None:
+        return timeout
+    remaining = max(remaining, 0.001)
+    if timeout is None:
+        return remaining
+    if isinstance(timeout, tuple):
+        return tuple(remaining if part is None else min(part, remaining) for part in timeout)
+    return min(timeout, remaining)
+
+async def run_until(awaitable, deadline):
+    """Await in the current task, raising `asyncio.TimeoutError` past `deadline` (a timestamp).
+
+    Unlike `asyncio.wait_for` this doesn't start a task per call, which adds up
+    for awaits as frequent as the updates of a streamed turn.
+    """
+    if deadline is None:
+        return await awaitable
+    task = asyncio.current_task()
+    expired = False
+
+    def expire():
+        nonlocal expired
+        expired = True
+        task.cancel()
+
+    timer = asyncio.get_running_loop().call_later(max(0.0, deadline - time.time()), expire)
+    try:
+        return await awaitable
+    except asyncio.CancelledError:
+        if not expired:
+            raise
+        if hasattr(task, "uncancel"):
+            task.uncancel()
+        raise asyncio.TimeoutError() from None
+    finally:
+        timer.cancel()
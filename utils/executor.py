@@ -0,0 +1,135 @@
+import asyncio
+import inspect
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.deadlines import CancelScope, active_scope, run_until
+
+# "concurrent" runs independent tool calls at the same time, "serial" runs them one by one
+TOOL_EXECUTOR = os.getenv("TOOL_EXECUTOR", "concurrent")
+# Threads shared by all conversations for running blocking (sync generator) tools
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "32"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+_GROUP_DONE = object()
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool")
+        return _pool
+
+def _drain(key, generator, scope):
+    """Exhaust a tool generator, turning its yields (or its failure) into events.
+
+    The scope is checked between yields: once it timed out or was cancelled the
+    generator is closed and nothing more is reported for it.
+    """
+    try:
+        with active_scope(scope):
+            for tool_yield in generator:
+                if scope.cancelled:
+                    break
+                yield key, tool_yield, None
+    except Exception as tool_exception:
+        if not scope.cancelled:
+            yield key, None, tool_exception
+    finally:
+        generator.close()
+
+def _drain_to_loop(key, generator, scope, events, loop):
+    """Runs on a worker thread: forwards a blocking tool generator's events to the event loop"""
+    for event in _drain(key, generator, scope):
+        loop.call_soon_threadsafe(events.put_nowait, event)
+
+async def _drain_async(key, generator, scope, events):
+    try:
+        while True:
+            tool_yield = await run_until(generator.__anext__(), scope.deadline)
+            events.put_nowait((key, tool_yield, None))
+    except StopAsyncIteration:
+        pass
+    except asyncio.TimeoutError:
+        scope.cancel("timeout")
+    except Exception as tool_exception:
+        events.put_nowait((key, None, tool_exception))
+    finally:
+        await generator.aclose()
+
+async def _run_job(key, generator, timeout, deadline, scopes, events, loop):
+    # The job's own timeout starts now, not while it waited for the jobs ahead of it
+    scope = CancelScope(timeout, deadline)
+    scopes.append(scope)
+
+    # Native async tools run on the loop, blocking generator tools are offloaded to threads
+    if inspect.isasyncgen(generator):
+        await _drain_async(key, generator, scope, events)
+    else:
+        # A thread can't be interrupted: on timeout the job is reported and abandoned, and the
+        # thread stops at the tool's next checkpoint (its HTTP calls are bounded by the scope)
+        future = loop.run_in_executor(
+            _get_pool(), _drain_to_loop, key, generator, scope, events, loop
+        )
+        try:
+            await asyncio.wait_for(asyncio.shield(future), scope.remaining())
+        except asyncio.TimeoutError:
+            scope.cancel("timeout")
+
+    if scope.reason == "timeout":
+        events.put_nowait((key, None, scope.error()))
+
+async def _run_group(group, deadline, scopes, events):
+    loop = asyncio.get_running_loop()
+    try:
+        for key, generator, timeout in group:
+            await _run_job(key, generator, timeout, deadline, scopes, events, loop)
+    finally:
+        events.put_nowait(_GROUP_DONE)
+
+async def execute_tools(jobs, deadline=None):
+    """Run `(key, generator, serialized, timeout)` jobs, yielding their events as they arrive.
+
+    Events are `(key, tool_yield, error)` tuples. Independent jobs run concurrently.
+    Serialized jobs (tools that mutate state) are chained so they run one at a time, in
+    call order. Generators may be async (run on the event loop) or plain blocking ones
+    (run on a bounded thread pool).
+
+    Each job gets `timeout` seconds from when it starts, and none runs past `deadline`
+    (a timestamp); a job out of time reports a `ToolTimeout` error. Closing this
+    generator (eg: the turn was cancelled) cancels every job still running.
+    """
+    if TOOL_EXECUTOR == "serial":
+        in_order = [(key, generator, timeout) for key, generator, _, timeout in jobs]
+        groups = [in_order] if in_order else []
+    else:
+        serialized = [
+            (key, generator, timeout)
+            for key, generator, is_serialized, timeout in jobs if is_serialized
+        ]
+        groups = [
+            [(key, generator, timeout)]
+            for key, generator, is_serialized, timeout in jobs if not is_serialized
+        ]
+        if serialized:
+            groups.append(serialized)
+
+    events = asyncio.Queue()
+    scopes = []
+    tasks = [asyncio.create_task(_run_group(group, deadline, scopes, events)) for group in groups]
+    try:
+        pending = len(tasks)
+        while pending:
+            event = await events.get()
+            if event is _GROUP_DONE:
+                pending -= 1
+                continue
+            yield event
+    finally:
+        for scope in scopes:
+            scope.cancel()
+        for task in tasks:
+            task.cancel()
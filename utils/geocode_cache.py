@@ -0,0 +1,103 @@
+import os
+import re
+import threading
+import unicodedata
+
+from utils.cache import LRUCache
+from utils.sqlite_kv import SQLiteKV
+
+# SQLite file shared by all worker processes (empty keeps the cache in memory only)
+GEOCODE_CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", "data/geocode_cache.sqlite3")
+GEOCODE_CACHE_TTL = int(os.getenv("GEOCODE_CACHE_TTL", str(90 * 24 * 60 * 60)))
+GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv("GEOCODE_CACHE_MAX_ENTRIES", "4096"))
+
+# Common street-type abbreviations, expanded so "Av. X" and "Avenue X" share an entry
+ABBREVIATIONS = {
+    "st": "street", "str": "street", "ave": "avenue", "av": "avenue", "rd": "road",
+    "blvd": "boulevard", "dr": "drive", "ln": "lane", "sq": "square", "pl": "place",
+    "hwy": "highway", "pkwy": "parkway", "ct": "court", "mt": "mount", "ft": "fort",
+    "apt": "apartment", "bldg": "building", "r": "rua", "pc": "praca"
+}
+
+# Abbreviations that are also state or country codes ("Hartford, CT", "Warsaw, PL"),
+# left as they are in the last comma-separated part of an address
+AMBIGUOUS_ABBREVIATIONS = {"st", "ct", "mt", "pl"}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def normalize_address(address):
+    """Cache key for an address: case, accents, punctuation, whitespace and abbreviations
+    don't matter"""
+    text = unicodedata.normalize("NFKD", str(address).lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    parts = [re.findall(r"\w+", part) for part in text.split(",")]
+    parts = [words for words in parts if words]
+    normalized = []
+    for index, words in enumerate(parts):
+        last = index == len(parts) - 1
+        for word in words:
+            if last and word in AMBIGUOUS_ABBREVIATIONS:
+                normalized.append(word)
+            else:
+                normalized.append(ABBREVIATIONS.get(word, word))
+    return " ".join(normalized)
+
+class GeocodeCache:
+    """Geocoding results keyed by normalized address, in memory and in an SQLite file.
+
+    The SQLite file (WAL mode) is shared across worker processes and restarts;
+    the in-memory LRU in front of it saves the query for hot addresses. Lookups
+    run on tool threads, so reading the file synchronously is fine.
+    """
+
+    def __init__(
+        self, path=GEOCODE_CACHE_PATH, ttl=GEOCODE_CACHE_TTL, max_entries=GEOCODE_CACHE_MAX_ENTRIES
+    ):
+        self.memory = LRUCache(max_entries=max_entries, default_ttl=ttl)
+        self.path = path
+        self.ttl = ttl
+        # v2: keys from before ambiguous abbreviations were kept may hold another place's result
+        self.disk = SQLiteKV(path, "geocodes_v2", ttl=ttl) if path else None
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, address):
+        key = normalize_address(address)
+        result = self.memory.get(key)
+        if result is None and self.disk:
+            result = self.disk.get(key)
+            if result is not None:
+                self.memory.set(key, result)
+
+        with self._stats_lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def set(self, address, result):
+        key = normalize_address(address)
+        self.memory.set(key, result)
+        if self.disk:
+            self.disk.set(key, result)
+
+    def stats(self):
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.memory)
+            }
+
+def get_geocode_cache():
+    """Process-wide geocode cache, created on first use"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = GeocodeCache()
+        return _cache
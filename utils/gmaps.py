@@ -0,0 +1,197 @@
+import os
+import random
+import threading
+import time
+
+from utils import deadlines
+
+GOOGLE_MAPS_QPS = float(os.getenv("GOOGLE_MAPS_QPS", "10"))
+GOOGLE_MAPS_POOL_SIZE = int(os.getenv("GOOGLE_MAPS_POOL_SIZE", "10"))
+GOOGLE_MAPS_MAX_RETRIES = int(os.getenv("GOOGLE_MAPS_MAX_RETRIES", "3"))
+GOOGLE_MAPS_TIMEOUT = float(os.getenv("GOOGLE_MAPS_TIMEOUT", "10"))
+
+# API statuses / HTTP codes worth retrying (quota and transient server errors)
+RETRYABLE_STATUSES = ("OVER_QUERY_LIMIT", "RESOURCE_EXHAUSTED", "UNKNOWN_ERROR")
+RETRYABLE_HTTP_CODES = (429, 500, 502, 503, 504)
+
+_client = None
+_client_lock = threading.Lock()
+
+class RateLimiter:
+    """Thread-safe token bucket, `acquire()` blocks until a request may be sent"""
+
+    def __init__(self, qps, burst=None):
+        self.qps = qps
+        self.capacity = burst or max(1.0, qps)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, returning how long we had to wait for it"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.qps)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.qps
+            deadlines.sleep(delay)
+            waited += delay
+
+def _is_retryable(exception):
+    try:
+        import googlemaps
+    except ImportError:
+        return False
+
+    if isinstance(exception, googlemaps.exceptions.ApiError):
+        return exception.status in RETRYABLE_STATUSES
+    if isinstance(exception, googlemaps.exceptions.HTTPError):
+        return exception.status_code in RETRYABLE_HTTP_CODES
+    return isinstance(
+        exception, (googlemaps.exceptions.Timeout, googlemaps.exceptions.TransportError)
+    )
+
+class MapsClient:
+    """Shared wrapper around a `googlemaps.Client` (or a fake exposing the same methods).
+
+    Every API method call (`places_nearby`, `geocode`, `place`, ...) goes through a
+    process-wide QPS limiter and is retried with exponential backoff and jitter on
+    quota and transient errors. Call counters and connection pool usage are
+    available through `stats()`.
+    """
+
+    def __init__(
+        self,
+        client,
+        qps=GOOGLE_MAPS_QPS,
+        max_retries=GOOGLE_MAPS_MAX_RETRIES,
+        is_retryable=_is_retryable
+    ):
+        self.client = client
+        self.limiter = RateLimiter(qps)
+        self.max_retries = max_retries
+        self.is_retryable = is_retryable
+        self._stats_lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.errors = 0
+        self.throttled_seconds = 0.0
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        if not callable(method):
+            return method
+
+        def call(*args, **kwargs):
+            return self._call(method, *args, **kwargs)
+        return call
+
+    def _call(self, method, *args, **kwargs):
+        attempt = 0
+        while True:
+            # A timed out or cancelled tool call doesn't send (or retry) any more requests
+            scope = deadlines.current_scope()
+            if scope:
+                scope.check()
+
+            waited = self.limiter.acquire()
+            with self._stats_lock:
+                self.calls += 1
+                self.throttled_seconds += waited
+            try:
+                return method(*args, **kwargs)
+            except Exception as exception:
+                if attempt >= self.max_retries or not self.is_retryable(exception):
+                    with self._stats_lock:
+                        self.errors += 1
+                    raise
+                with self._stats_lock:
+                    self.retries += 1
+                deadlines.sleep(min(8.0, 0.5 * 2 ** attempt) * (0.5 + random.random()))
+                attempt += 1
+
+    def stats(self):
+        with self._stats_lock:
+            stats = {
+                "calls": self.calls,
+                "retries": self.retries,
+                "errors": self.errors,
+                "throttled_seconds": round(self.throttled_seconds, 3)
+            }
+
+        # Connection reuse as seen by urllib3, when backed by a real requests session
+        session = getattr(self.client, "session", None)
+        adapter = session.get_adapter("https://") if session is not None else None
+        poolmanager = getattr(adapter, "poolmanager", None)
+        if poolmanager is not None:
+            stats["pools"] = [
+                {
+                    "host": pool.host,
+                    "connections_opened": pool.num_connections,
+                    "requests": pool.num_requests,
+                    "idle_connections": pool.pool.qsize() if pool.pool else 0
+                }
+                for pool in [poolmanager.pools[key] for key in poolmanager.pools.keys()]
+            ]
+        return stats
+
+def _create_client():
+    import googlemaps
+    from requests.adapters import HTTPAdapter
+    from requests.exceptions import HTTPError
+
+    client = googlemaps.Client(
+        key=os.getenv('GOOGLE_MAPS_API_KEY'),
+        timeout=GOOGLE_MAPS_TIMEOUT,
+        # Quota errors are retried by MapsClient, and throttling is done by its
+        # thread-safe limiter rather than the client's own per-instance one
+        retry_over_query_limit=False,
+        queries_per_second=1000
+    )
+
+    class DeadlineAdapter(HTTPAdapter):
+        """Bounds every request's timeout by what is left of the calling tool's deadline.
+
+        Server errors are raised here, before the client's own retry loop (which
+        sleeps outside the limiter and the deadline) sees them: the client wraps
+        them as a `TransportError`, which MapsClient retries.
+        """
+
+        def send(self, request, **kwargs):
+            kwargs["timeout"] = deadlines.clamp_timeout(kwargs.get("timeout"))
+            response = super().send(request, **kwargs)
+            if response.status_code >= 500:
+                response.close()
+                path = request.path_url.split("?")[0]
+                raise HTTPError(f"{response.status_code} Server Error: {path}", response=response)
+            return response
+
+    # Keep-alive connections, enough of them for concurrent tool calls
+    adapter = DeadlineAdapter(pool_connections=4, pool_maxsize=GOOGLE_MAPS_POOL_SIZE)
+    client.session.mount("https://", adapter)
+    return MapsClient(client)
+
+def get_client():
+    """Process-wide Maps client, created on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = _create_client()
+        return _client
+
+def set_client(client):
+    """Install a client (eg: a fake for tests), wrapped with the same limiter and retries"""
+    global _client
+    with _client_lock:
+        _client = client if client is None or isinstance(client, MapsClient) else MapsClient(client)
+
+def client_stats():
+    """Stats of the shared client, empty until it has been created"""
+    with _client_lock:
+        client = _client
+    return client.stats() if client is not None else {}
@@ -1,41 +1,143 @@
+import atexit
+import json
 import logging
 import os
+import queue
+import random
+import threading
 from datetime import datetime
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
-def setup_logger(name="botty"):
-    # Create logs directory if it doesn't exist
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
+# "json" writes one JSON object per line to the log file, "text" the classic pipe-separated format
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Hand records to a background writer thread instead of writing them on the caller's thread
+LOG_QUEUE = os.getenv("LOG_QUEUE", "true").lower() == "true"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Large payloads (tool inputs/results) are truncated to this many characters
+# and sampled at this rate
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "2000"))
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "1.0"))
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_setup_lock = threading.Lock()
+_listeners = {}
+
+def _extras(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with `extra` fields kept as structured values"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "line": record.lineno,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        entry.update(_extras(record))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class TextFormatter(logging.Formatter):
+    """Classic text format, with `extra` fields appended as `key=value`"""
+
+    def format(self, record):
+        text = super().format(record)
+        extras = _extras(record)
+        if extras:
+            text += " " + " ".join(
+                f"{key}={json.dumps(value, default=str)}" for key, value in extras.items()
+            )
+        return text
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that never blocks the caller: records are dropped (and counted) when
+    the queue is full"""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # Listener handlers live in this process, so formatting (and any payload
+        # serialization) is left to the writer thread instead of the caller
+        return record
 
-    # Configure logger
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+class Payload:
+    """Log argument for large values, serialized and truncated only when the record is written"""
+
+    def __init__(self, value, max_chars=LOG_PAYLOAD_MAX_CHARS):
+        self.value = value
+        self.max_chars = max_chars
+
+    def __str__(self):
+        text = self.value
+        if not isinstance(text, str):
+            text = json.dumps(text, default=str, ensure_ascii=False)
+        if self.max_chars and len(text) > self.max_chars:
+            text = f"{text[:self.max_chars]}... (+{len(text) - self.max_chars} chars)"
+        return text
+
+def log_payload(logger, message, value, level=logging.DEBUG):
+    """Log a potentially large payload at `level`, sampled and truncated"""
+    if not logger.isEnabledFor(level) or random.random() >= LOG_PAYLOAD_SAMPLE_RATE:
+        return
+    logger.log(level, "%s: %s", message, Payload(value), stacklevel=2)
+
+def setup_logger(name="botty"):
+    """Configure the named logger once; later calls return it untouched"""
     logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
-
-    # Create formatters
-    file_formatter = logging.Formatter(
-        '%(asctime)s | %(levelname)s | %(module)s:%(lineno)d | %(message)s'
-    )
-    console_formatter = logging.Formatter(
-        '%(levelname)s: %(message)s'
-    )
-
-    # File handler (rotating, max 5MB per file, keep 5 backup files)
-    file_handler = RotatingFileHandler(
-        f'logs/botty_{datetime.now().strftime("%Y%m%d")}.log',
-        maxBytes=5*1024*1024,
-        backupCount=5
-    )
-    file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(file_formatter)
-
-    # Console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(console_formatter)
-
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    with _setup_lock:
+        if name in _listeners:
+            return logger
+
+        # Create logs directory if it doesn't exist
+        if not os.path.exists('logs'):
+            os.makedirs('logs')
+
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+
+        # File handler (rotating, max 5MB per file, keep 5 backup files)
+        file_handler = RotatingFileHandler(
+            f'logs/botty_{datetime.now().strftime("%Y%m%d")}.log',
+            maxBytes=5*1024*1024,
+            backupCount=5
+        )
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter(
+            '%(asctime)s | %(levelname)s | %(module)s:%(lineno)d | %(message)s'
+        ))
+
+        # Console handler
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(logging.INFO)
+        console_handler.setFormatter(TextFormatter('%(levelname)s: %(message)s'))
+
+        if LOG_QUEUE:
+            # Handlers only run on the listener thread, so a slow disk never stalls a turn
+            log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+            listener = QueueListener(
+                log_queue, file_handler, console_handler, respect_handler_level=True
+            )
+            listener.start()
+            atexit.register(listener.stop)
+            logger.addHandler(DroppingQueueHandler(log_queue))
+        else:
+            listener = None
+            logger.addHandler(file_handler)
+            logger.addHandler(console_handler)
 
+        _listeners[name] = listener
     return logger
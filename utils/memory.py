@@ -0,0 +1,115 @@
+import math
+import re
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# Rough footprint of the index per indexed token (postings dict entry, frequency, length)
+INDEX_BYTES_PER_TOKEN = 64
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+class MemoryStore(list):
+    """List of memories with a BM25 index for picking the ones relevant to a query.
+
+    Behaves like the plain list it replaces (tools keep addressing memories by
+    index, and it serializes as a JSON list). Appends are indexed incrementally;
+    any other mutation shifts positions, so the index is rebuilt on the next search.
+    `version` changes with every mutation, for views that only re-render on change.
+    """
+
+    def __init__(self, memories=(), k1=1.5, b=0.75):
+        super().__init__()
+        self.k1 = k1
+        self.b = b
+        self.version = 0
+        self._reset_index()
+        for memory in memories:
+            self.append(memory)
+
+    def __reduce__(self):
+        return (self.__class__, (list(self), self.k1, self.b))
+
+    def append(self, memory):
+        super().append(memory)
+        self.version += 1
+        if not self._dirty:
+            self._index_document(len(self) - 1, memory)
+
+    def search(self, query, k):
+        """Positions of the (up to) `k` memories best matching `query`, best first"""
+        if self._dirty:
+            self._rebuild()
+        terms = set(tokenize(query))
+        if not terms or not self:
+            return []
+
+        average_length = self._total_length / len(self)
+        scores = Counter()
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (len(self) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, frequency in postings.items():
+                length_norm = 1 - self.b + self.b * self._lengths[position] / average_length
+                weight = frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+                scores[position] += idf * weight
+
+        # Newer memories win ties
+        return sorted(scores, key=lambda position: (scores[position], position), reverse=True)[:k]
+
+    def relevant(self, query, k):
+        """Positions (ascending) of the memories to show for `query`: all of them if there are
+        at most `k`, otherwise the best matches topped up with the most recent memories"""
+        if len(self) <= k:
+            return list(range(len(self)))
+        positions = self.search(query, k) if query else []
+        for position in range(len(self) - 1, -1, -1):
+            if len(positions) >= k:
+                break
+            if position not in positions:
+                positions.append(position)
+        return sorted(positions)
+
+    def stats(self):
+        """Memory count and rough in-memory footprint (texts plus index), in bytes"""
+        text_bytes = sum(len(str(memory).encode()) for memory in self)
+        return {
+            "memories": len(self),
+            "bytes": text_bytes + INDEX_BYTES_PER_TOKEN * self._total_length
+        }
+
+    def _reset_index(self):
+        self._postings = {}
+        self._lengths = []
+        self._total_length = 0
+        self._dirty = False
+
+    def _index_document(self, position, memory):
+        tokens = tokenize(memory)
+        for term, frequency in Counter(tokens).items():
+            self._postings.setdefault(term, {})[position] = frequency
+        self._lengths.append(len(tokens))
+        self._total_length += len(tokens)
+
+    def _rebuild(self):
+        self._reset_index()
+        for position, memory in enumerate(self):
+            self._index_document(position, memory)
+
+def _invalidating(name):
+    method = getattr(list, name)
+    def wrapper(self, *args, **kwargs):
+        self._dirty = True
+        self.version += 1
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = name
+    return wrapper
+
+# Mutations other than append can shift positions, so they mark the index stale
+for _name in (
+    "__setitem__", "__delitem__", "__iadd__", "__imul__",
+    "insert", "pop", "remove", "extend", "clear", "sort", "reverse"
+):
+    setattr(MemoryStore, _name, _invalidating(_name))
@@ -0,0 +1,265 @@
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_metrics = []
+_collectors = []
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = [
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    ]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def _render_value(self, key, value):
+        counts, total = value
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            labels = _format_labels(self.labels, key, {"le": le})
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+def register_collector(collector):
+    """Register a callable run at scrape time (eg: to copy cache stats into gauges)"""
+    _collectors.append(collector)
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    for collector in _collectors:
+        collector()
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serve `/metrics` from a daemon thread, next to the Gradio app"""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            payload = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+# Agent metrics
+TURN_SECONDS = Histogram("botty_turn_seconds", "Wall time of a chatbot turn", ("model",))
+TURN_TTFT_SECONDS = Histogram(
+    "botty_turn_ttft_seconds", "Time from user message to the first model token", ("model",)
+)
+TURN_ITERATIONS = Histogram(
+    "botty_turn_iterations", "Model requests (tool-loop iterations) per turn", ("model",),
+    buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+)
+TURN_RENDER_SECONDS = Histogram(
+    "botty_turn_render_seconds", "Time per turn spent by the UI consuming yielded updates",
+    ("model",)
+)
+TURN_ERRORS = Counter("botty_turn_errors_total", "Turns that ended with an error", ("model",))
+LLM_REQUEST_SECONDS = Histogram(
+    "botty_llm_request_seconds", "OpenRouter request latency, until the full completion",
+    ("model", "cached")
+)
+LLM_TTFT_SECONDS = Histogram(
+    "botty_llm_ttft_seconds", "OpenRouter time to first token", ("model", "cached")
+)
+LLM_ROUTING = Counter(
+    "botty_llm_routing_total",
+    "Model fallbacks (on the failing model) and hedged requests (on the alternate model)",
+    ("model", "event")
+)
+LLM_TOKENS = Counter(
+    "botty_llm_tokens_total", "Tokens reported in response usage", ("model", "kind")
+)
+TOOL_SECONDS = Histogram(
+    "botty_tool_seconds", "Tool execution time", ("tool", "cached", "status")
+)
+TOOL_CACHE_LOOKUPS = Counter(
+    "botty_tool_cache_lookups_total", "Tool cache lookups", ("tool", "result")
+)
+SCHEDULER_ACTIVE = Gauge("botty_scheduler_active_turns", "Turns admitted and running")
+SCHEDULER_QUEUE_DEPTH = Gauge("botty_scheduler_queue_depth", "Turns waiting for admission")
+SCHEDULER_WAIT_SECONDS = Histogram(
+    "botty_scheduler_wait_seconds", "Time turns waited in the queue before admission",
+    buckets=(0.01, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+)
+STATS = Gauge(
+    "botty_component_stat", "Point-in-time stats of caches, sessions and clients",
+    ("component", "stat")
+)
+
+def collect_stats(component, stats_function):
+    """Publish the numeric entries of a `stats()` dict as gauges at scrape time"""
+    def collector():
+        for stat, value in stats_function().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                STATS.set(value, component=component, stat=stat)
+    register_collector(collector)
+
+class TurnSpan:
+    """Structured record of one chatbot turn: model requests, tools, iterations and render time.
+
+    `finish()` folds it into the histograms above and returns it as a dict for logging.
+    """
+
+    def __init__(self, model, session_id=None, queue_seconds=0.0):
+        self.model = model
+        self.session_id = session_id
+        self.queue_seconds = queue_seconds
+        self.started_at = time.time()
+        self.ttft = None
+        self.llm_requests = []
+        self.llm_cache_hit = False
+        self.llm_model = None
+        self.tools = []
+        self.render_seconds = 0.0
+        self.error = None
+
+    def record_llm(self, started_at, first_token_time=None, usage=None):
+        """Record a model request that started at `started_at` and has just completed
+        (served by `llm_model`, if set)"""
+        now = time.time()
+        first_token_time = first_token_time or now
+        if self.ttft is None:
+            self.ttft = first_token_time - self.started_at
+        self.llm_requests.append({
+            "latency": round(now - started_at, 4),
+            "ttft": round(first_token_time - started_at, 4),
+            "prompt_tokens": (getattr(usage, "prompt_tokens", 0) or 0) if usage else 0,
+            "completion_tokens": (getattr(usage, "completion_tokens", 0) or 0) if usage else 0,
+            "cached": self.llm_cache_hit,
+            "model": self.llm_model or self.model
+        })
+        self.llm_cache_hit = False
+        self.llm_model = None
+
+    def record_tool(self, name, duration, cached=None, error=False):
+        """`cached` is None for tools that bypass the cache"""
+        self.tools.append(
+            {"name": name, "duration": round(duration, 4), "cached": cached, "error": error}
+        )
+
+    def finish(self):
+        duration = time.time() - self.started_at
+        TURN_SECONDS.observe(duration, model=self.model)
+        TURN_ITERATIONS.observe(len(self.llm_requests), model=self.model)
+        TURN_RENDER_SECONDS.observe(self.render_seconds, model=self.model)
+        if self.ttft is not None:
+            TURN_TTFT_SECONDS.observe(self.ttft, model=self.model)
+        if self.error:
+            TURN_ERRORS.inc(model=self.model)
+
+        for request in self.llm_requests:
+            cached = str(request["cached"]).lower()
+            LLM_REQUEST_SECONDS.observe(request["latency"], model=request["model"], cached=cached)
+            LLM_TTFT_SECONDS.observe(request["ttft"], model=request["model"], cached=cached)
+            if not request["cached"]:
+                LLM_TOKENS.inc(request["prompt_tokens"], model=request["model"], kind="prompt")
+                LLM_TOKENS.inc(
+                    request["completion_tokens"], model=request["model"], kind="completion"
+                )
+
+        for tool in self.tools:
+            cached = str(bool(tool["cached"])).lower()
+            status = "error" if tool["error"] else "ok"
+            TOOL_SECONDS.observe(tool["duration"], tool=tool["name"], cached=cached, status=status)
+            if tool["cached"] is not None:
+                result = "hit" if tool["cached"] else "miss"
+                TOOL_CACHE_LOOKUPS.inc(tool=tool["name"], result=result)
+
+        return {
+            "session_id": self.session_id,
+            "model": self.model,
+            "duration": round(duration, 4),
+            "queue_seconds": round(self.queue_seconds, 4),
+            "ttft": round(self.ttft, 4) if self.ttft is not None else None,
+            "iterations": len(self.llm_requests),
+            "render_seconds": round(self.render_seconds, 4),
+            "llm_requests": self.llm_requests,
+            "tools": self.tools,
+            "error": self.error
+        }
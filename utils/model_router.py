@@ -0,0 +1,230 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+import openai
+
+from utils.deadlines import run_until
+from utils.metrics import LLM_ROUTING
+from utils.streaming import close_stream
+
+# Models tried, in order, when the selected one fails or times out
+# (comma separated, empty disables fallbacks)
+MODEL_FALLBACKS = [
+    model.strip() for model in os.getenv("MODEL_FALLBACKS", "").split(",") if model.strip()
+]
+# Seconds a model may take to produce its first token before it counts as failed
+MODEL_FIRST_TOKEN_TIMEOUT = float(os.getenv("MODEL_FIRST_TOKEN_TIMEOUT", "30"))
+# Opt-in: send a second request to the next model of the chain when the first one
+# is slower than usual
+MODEL_HEDGING = os.getenv("MODEL_HEDGING", "false").lower() == "true"
+# A request is "slower than usual" past this quantile of the model's recent first-token latencies...
+MODEL_HEDGE_QUANTILE = float(os.getenv("MODEL_HEDGE_QUANTILE", "0.95"))
+# ...bounded below by this many seconds, and this default until the model has enough samples
+MODEL_HEDGE_MIN_DELAY = float(os.getenv("MODEL_HEDGE_MIN_DELAY", "0.5"))
+MODEL_HEDGE_DEFAULT_DELAY = float(os.getenv("MODEL_HEDGE_DEFAULT_DELAY", "5.0"))
+MODEL_LATENCY_WINDOW = int(os.getenv("MODEL_LATENCY_WINDOW", "200"))
+MODEL_LATENCY_MIN_SAMPLES = 20
+
+# HTTP statuses worth trying another model for
+# (OpenRouter answers 404 when a model has no available endpoint)
+RETRYABLE_STATUSES = {404, 408, 409, 429}
+
+def is_retryable(error):
+    """Errors another model (or another try) might not run into"""
+    if isinstance(error, (asyncio.TimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500 or error.status_code in RETRYABLE_STATUSES
+    return False
+
+async def _prepend(chunk, chunks, stream):
+    """The rest of a stream's `chunks` with the already consumed first `chunk` put back in front"""
+    try:
+        yield chunk
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        await close_stream(stream)
+
+class ModelLatencies:
+    """Recent first-token latencies and failures per model, for choosing hedging thresholds"""
+
+    def __init__(self, window=MODEL_LATENCY_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def observe(self, model, seconds):
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def fail(self, model):
+        with self._lock:
+            self._failures[model] = self._failures.get(model, 0) + 1
+
+    def quantile(self, model, q):
+        """The `q` quantile of the model's recent latencies, or None without enough samples"""
+        with self._lock:
+            samples = sorted(self._samples.get(model, ()))
+        if len(samples) < MODEL_LATENCY_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def stats(self):
+        with self._lock:
+            models = set(self._samples) | set(self._failures)
+        stats = {}
+        for model in sorted(models):
+            p50, p95 = self.quantile(model, 0.5), self.quantile(model, 0.95)
+            with self._lock:
+                stats[model] = {
+                    "samples": len(self._samples.get(model, ())),
+                    "failures": self._failures.get(model, 0)
+                }
+            if p50 is not None:
+                stats[model].update(ttft_p50=round(p50, 4), ttft_p95=round(p95, 4))
+        return stats
+
+class ModelRouter:
+    """Sends a completion request along a chain of models, with fallbacks and optional hedging.
+
+    A request fails over to the next model of the chain on a retryable error or,
+    when streamed, if no first token arrives within `first_token_timeout`. With
+    hedging, a streamed request still waiting for its first token past its
+    model's usual latency (`hedge_quantile` of the recent ones) races a second
+    request to the next model; the first to produce a token wins and the other
+    one is cancelled.
+    """
+
+    def __init__(
+        self,
+        fallbacks=MODEL_FALLBACKS,
+        hedging=MODEL_HEDGING,
+        first_token_timeout=MODEL_FIRST_TOKEN_TIMEOUT,
+        hedge_quantile=MODEL_HEDGE_QUANTILE
+    ):
+        self.fallbacks = fallbacks
+        self.hedging = hedging
+        self.first_token_timeout = first_token_timeout
+        self.hedge_quantile = hedge_quantile
+        self.latencies = ModelLatencies()
+        self.fallbacks_used = 0
+        self.hedges = 0
+        self.hedges_won = 0
+
+    def chain(self, model):
+        return [model] + [fallback for fallback in self.fallbacks if fallback != model]
+
+    def hedge_delay(self, model):
+        delay = self.latencies.quantile(model, self.hedge_quantile)
+        return MODEL_HEDGE_DEFAULT_DELAY if delay is None else max(MODEL_HEDGE_MIN_DELAY, delay)
+
+    async def create(self, create, kwargs, stream=False):
+        """`(response, model)`: the response of the first model of the chain to come through.
+
+        `model` is the one that answered. `create` is `client.chat.completions.create`;
+        a streamed response is returned once its first chunk arrived.
+        """
+        chain = self.chain(kwargs["model"])
+        for position, model in enumerate(chain):
+            # Only a stream has a first token to hedge on, a whole completion has no usual latency
+            hedge_model = None
+            if stream and self.hedging and position + 1 < len(chain):
+                hedge_model = chain[position + 1]
+            try:
+                return await self._race(create, kwargs, stream, model, hedge_model)
+            except Exception as error:
+                if not is_retryable(error) or position + 1 == len(chain):
+                    raise
+                self.fallbacks_used += 1
+                LLM_ROUTING.inc(model=model, event="fallback")
+
+    def stats(self):
+        return {
+            "fallbacks": self.fallbacks_used,
+            "hedges": self.hedges,
+            "hedges_won": self.hedges_won,
+            "models": self.latencies.stats()
+        }
+
+    async def _race(self, create, kwargs, stream, model, hedge_model):
+        primary = asyncio.ensure_future(self._first_token(create, kwargs, stream, model))
+        if hedge_model is None:
+            return await primary
+
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(model))
+            if not done:
+                self.hedges += 1
+                LLM_ROUTING.inc(model=hedge_model, event="hedge")
+                hedge = self._first_token(create, kwargs, stream, hedge_model)
+                tasks.add(asyncio.ensure_future(hedge))
+
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in done if not task.exception()]
+                if winners:
+                    winner = primary if primary in winners else winners[0]
+                    for task in winners:
+                        if task is not winner:
+                            await close_stream(task.result()[0])
+                    if winner is not primary:
+                        self.hedges_won += 1
+                        LLM_ROUTING.inc(model=hedge_model, event="hedge_won")
+                    return winner.result()
+            # Both failed, the primary's error decides what happens next
+            return primary.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            losers = await asyncio.gather(*tasks, return_exceptions=True)
+            for loser in losers:
+                if isinstance(loser, tuple):
+                    await close_stream(loser[0])
+
+    async def _first_token(self, create, kwargs, stream, model):
+        if not stream:
+            # The whole completion arrives at once, only the client's own timeout bounds it
+            try:
+                return await create(**{**kwargs, "model": model}), model
+            except Exception:
+                self.latencies.fail(model)
+                raise
+
+        started_at = time.time()
+        deadline = started_at + self.first_token_timeout if self.first_token_timeout else None
+        try:
+            response = await run_until(create(**{**kwargs, "model": model}), deadline)
+            chunks = response.__aiter__()
+            try:
+                first_chunk = await run_until(chunks.__anext__(), deadline)
+            except BaseException:
+                await close_stream(response)
+                raise
+            response = _prepend(first_chunk, chunks, response)
+        except asyncio.CancelledError:
+            # Lost a race: it took at least this long, leaving it out would make the model
+            # look faster than it is
+            self.latencies.observe(model, time.time() - started_at)
+            raise
+        except Exception:
+            self.latencies.fail(model)
+            raise
+        self.latencies.observe(model, time.time() - started_at)
+        return response, model
+
+_router = None
+_router_lock = threading.Lock()
+
+def get_model_router():
+    """Process-wide model router, created on first use"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+PLACES_INDEX = os.getenv("PLACES_INDEX", "true").lower() == "true"
+PLACES_INDEX_MAX_REGIONS = int(os.getenv("PLACES_INDEX_MAX_REGIONS", "2048"))
+PLACES_INDEX_MAX_BYTES = int(os.getenv("PLACES_INDEX_MAX_BYTES", str(32 * 1024 * 1024)))
+
+EARTH_RADIUS_M = 6371000.0
+
+_index = None
+_index_lock = threading.Lock()
+
+def haversine_m(lat, lng, lats, lngs):
+    """Great-circle distances in meters from one point to arrays of points"""
+    lat, lng = np.radians(lat), np.radians(lng)
+    lats, lngs = np.radians(lats), np.radians(lngs)
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lngs - lng) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def _place_location(place):
+    location = place.get("geometry", {}).get("location", {})
+    return location.get("lat"), location.get("lng")
+
+class PlacesIndex:
+    """Nearby-search results indexed by the circle they cover, to answer overlapping searches.
+
+    Each search (with a radius) is recorded as a region: its center, radius, the
+    query filters and the places found. A region is complete when Google returned
+    every match (no next page); only complete regions can answer a query circle
+    they fully contain, since anything they're missing would be missing locally too.
+    Places are filtered with a vectorized haversine and keep Google's prominence order.
+    Callers should add places trimmed to the fields they need; the oldest regions
+    are dropped beyond `max_regions` regions or `max_bytes` of (estimated) places.
+    """
+
+    def __init__(self, max_regions=PLACES_INDEX_MAX_REGIONS, max_bytes=PLACES_INDEX_MAX_BYTES):
+        self.max_regions = max_regions
+        self.max_bytes = max_bytes
+        self._regions = OrderedDict()
+        self._bytes = 0
+        self._next_region_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.incomplete = 0
+        self.hit_age_seconds = 0.0
+        self.max_hit_age_seconds = 0.0
+
+    def add(self, filters, lat, lng, radius, places, complete):
+        located = [place for place in places if None not in _place_location(place)]
+        locations = [_place_location(place) for place in located]
+        locations = np.array(locations, dtype=float).reshape(-1, 2)
+        region = {
+            "filters": filters,
+            "center": (lat, lng),
+            "radius": radius,
+            "places": located,
+            "lats": locations[:, 0],
+            "lngs": locations[:, 1],
+            "complete": complete,
+            "fetched_at": time.time(),
+            "size": len(json.dumps(located, default=str)) + locations.nbytes
+        }
+        if region["size"] > self.max_bytes:
+            return
+        with self._lock:
+            self._regions[self._next_region_id] = region
+            self._next_region_id += 1
+            self._bytes += region["size"]
+            while len(self._regions) > self.max_regions or self._bytes > self.max_bytes:
+                _, evicted = self._regions.popitem(last=False)
+                self._bytes -= evicted["size"]
+
+    def lookup(self, filters, lat, lng, radius, max_age):
+        """`(places, age)` for the places within `radius` of the center, from a fresh complete
+        region covering the circle, or None"""
+        now = time.time()
+        with self._lock:
+            candidates = [
+                region for region in self._regions.values() if region["filters"] == filters
+            ]
+
+        covering = []
+        if candidates:
+            centers = np.array([region["center"] for region in candidates], dtype=float)
+            distances = haversine_m(lat, lng, centers[:, 0], centers[:, 1])
+            covering = [
+                region for region, distance in zip(candidates, distances)
+                if distance + radius <= region["radius"]
+            ]
+
+        fresh = [region for region in covering if now - region["fetched_at"] <= max_age]
+        usable = [region for region in fresh if region["complete"]]
+        with self._lock:
+            if not usable:
+                self.misses += 1
+                if covering and not fresh:
+                    self.stale += 1
+                elif fresh:
+                    self.incomplete += 1
+                return None
+
+            # The most recent covering region has the freshest data
+            region = max(usable, key=lambda region: region["fetched_at"])
+            age = now - region["fetched_at"]
+            self.hits += 1
+            self.hit_age_seconds += age
+            self.max_hit_age_seconds = max(self.max_hit_age_seconds, age)
+
+        inside = haversine_m(lat, lng, region["lats"], region["lngs"]) <= radius
+        return [place for place, keep in zip(region["places"], inside) if keep], age
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "regions": len(self._regions),
+                "complete_regions": sum(
+                    1 for region in self._regions.values() if region["complete"]
+                ),
+                "places": sum(len(region["places"]) for region in self._regions.values()),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "stale_misses": self.stale,
+                "incomplete_misses": self.incomplete,
+                "mean_hit_age_seconds": self.hit_age_seconds / self.hits if self.hits else 0.0,
+                "max_hit_age_seconds": self.max_hit_age_seconds
+            }
+
+def get_places_index():
+    """Process-wide places index, created on first use"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = PlacesIndex()
+        return _index
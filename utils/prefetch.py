@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import deadlines
+from utils.cache import LRUCache
+
+# Opt-in: fetch the following pages of a paginated search in the background, before anyone asks
+PLACES_PREFETCH = os.getenv("PLACES_PREFETCH", "false").lower() == "true"
+# Google only accepts a next_page_token a couple of seconds after issuing it
+PLACES_PAGE_TOKEN_DELAY = float(os.getenv("PLACES_PAGE_TOKEN_DELAY", "2.0"))
+PLACES_PREFETCH_WORKERS = int(os.getenv("PLACES_PREFETCH_WORKERS", "4"))
+
+# Page tokens stop working after a few minutes, so pages aren't kept longer than that
+PAGE_TTL = 5 * 60
+PAGE_TOKEN_ATTEMPTS = 4
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+def _is_token_not_ready(error):
+    return getattr(error, "status", None) == "INVALID_REQUEST"
+
+class PagePrefetcher:
+    """Fetches the pages behind page tokens, in the background or on demand, at most once per token.
+
+    `fetch_page(token)` does the actual request; a token that isn't valid yet is
+    retried after `delay` seconds. Pages are kept in a short-lived cache and a
+    request for a page that is still being prefetched waits for that fetch
+    instead of issuing its own.
+    """
+
+    def __init__(
+        self, delay=PLACES_PAGE_TOKEN_DELAY, max_workers=PLACES_PREFETCH_WORKERS, max_entries=512
+    ):
+        self.delay = delay
+        self.pages = LRUCache(max_entries=max_entries, default_ttl=PAGE_TTL)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.prefetched = 0
+        self.hits = 0
+        self.misses = 0
+
+    def prefetch(self, token, fetch_page):
+        """Start fetching `token`'s page in the background"""
+        if self.pages.get(token) is not None:
+            return
+        with self._lock:
+            if token in self._inflight:
+                return
+            self._inflight[token] = self._pool.submit(self._prefetch, token, fetch_page)
+
+    def get(self, token, fetch_page):
+        """The page behind `token`: from the cache, from a fetch in flight, or fetched now"""
+        page = self.pages.get(token)
+        with self._lock:
+            future = self._inflight.get(token) if page is None else None
+            if page is not None or future is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if page is not None:
+            return page
+        if future is not None:
+            # Waiting on a prefetch counts against the calling tool's deadline
+            page = future.result(timeout=deadlines.clamp_timeout(None))
+            if page is not None:
+                return page
+        return self._fetch(token, fetch_page)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "prefetched": self.prefetched,
+                "inflight": len(self._inflight),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+    def _prefetch(self, token, fetch_page):
+        try:
+            time.sleep(self.delay)
+            page = self._fetch(token, fetch_page)
+            with self._lock:
+                self.prefetched += 1
+            return page
+        except Exception:
+            # Whoever asks for the page later fetches it again and sees the error
+            return None
+        finally:
+            with self._lock:
+                self._inflight.pop(token, None)
+
+    def _fetch(self, token, fetch_page):
+        for attempt in range(PAGE_TOKEN_ATTEMPTS):
+            try:
+                page = fetch_page(token)
+                break
+            except Exception as error:
+                if not _is_token_not_ready(error) or attempt == PAGE_TOKEN_ATTEMPTS - 1:
+                    raise
+                deadlines.sleep(self.delay)
+        self.pages.set(token, page)
+        return page
+
+def get_page_prefetcher():
+    """Process-wide page prefetcher, created on first use"""
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = PagePrefetcher()
+        return _prefetcher
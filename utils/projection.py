@@ -0,0 +1,58 @@
+import json
+import os
+
+# Set to false to send raw tool results to the model
+TOOL_RESULT_PROJECTION = os.getenv("TOOL_RESULT_PROJECTION", "true").lower() == "true"
+# Default cap on list results (eg: places), tools may override it with `result_max_items`
+# (tools whose items are a field of the result name it with `result_items_key`)
+TOOL_RESULT_MAX_ITEMS = int(os.getenv("TOOL_RESULT_MAX_ITEMS", "10"))
+
+def project(value, fields):
+    """Keep only `fields` of a result; fields are dotted paths and apply to every item of lists"""
+    if isinstance(value, list):
+        return [project(item, fields) for item in value]
+    if not isinstance(value, dict):
+        return value
+
+    # Group paths by their first segment so `a.b` and `a.c` end up in the same `a`
+    groups = {}
+    for field in fields:
+        key, _, rest = field.partition(".")
+        groups.setdefault(key, []).append(rest)
+
+    projected = {}
+    for key, rests in groups.items():
+        if key not in value:
+            continue
+        projected[key] = value[key] if "" in rests else project(value[key], rests)
+    return projected
+
+def dumps(value):
+    """Minified JSON, the cheapest faithful encoding for the model"""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+def get_items(result, items_key=None):
+    """The list of items in a result: the result itself, or its `items_key` field (eg: `results`)"""
+    if isinstance(result, list):
+        return result
+    if items_key and isinstance(result, dict) and isinstance(result.get(items_key), list):
+        return result[items_key]
+    return None
+
+def project_tool_result(spec, tool_input, result):
+    """Apply a tool's `result_fields` allowlist and `result_max_items` truncation to its result"""
+    max_items = spec.get("result_max_items", TOOL_RESULT_MAX_ITEMS)
+    items_key = spec.get("result_items_key")
+    items = get_items(result, items_key)
+    if items is not None and max_items:
+        if isinstance(result, list):
+            result = items[:max_items]
+        else:
+            result = dict(result, **{items_key: items[:max_items]})
+
+    fields = spec.get("result_fields")
+    if callable(fields):
+        fields = fields(tool_input)
+    if fields:
+        result = project(result, fields)
+    return result
@@ -0,0 +1,129 @@
+import json
+import os
+import threading
+
+from utils.cache import LRUCache
+from utils.projection import dumps, get_items, project
+
+# Results whose full encoding is at least this many tokens are stored and sent to the model
+# as summary + handle
+RESULT_STORE = os.getenv("RESULT_STORE", "true").lower() == "true"
+RESULT_STORE_MIN_TOKENS = int(os.getenv("RESULT_STORE_MIN_TOKENS", "300"))
+RESULT_STORE_MAX_ENTRIES = int(os.getenv("RESULT_STORE_MAX_ENTRIES", "128"))
+RESULT_STORE_MAX_BYTES = int(os.getenv("RESULT_STORE_MAX_BYTES", str(4 * 1024 * 1024)))
+# Reduce stored results from previous turns to just their handle
+RESULT_STORE_COLLAPSE_OLD_TURNS = (
+    os.getenv("RESULT_STORE_COLLAPSE_OLD_TURNS", "true").lower() == "true"
+)
+
+HANDLE_PREFIX = '{"result_handle":'
+
+def _is_envelope(message):
+    """Whether a message is the tool result of a stored result (its summary or just its handle)"""
+    content = message.get("content")
+    if message["role"] != "tool" or not isinstance(content, str):
+        return False
+    return content.startswith(HANDLE_PREFIX)
+
+class ResultStore(LRUCache):
+    """Per-session store of full tool results, addressed by short handles (`r1`, `r2`, ...).
+
+    The model only sees a summary of large results; `fetch()` serves the rest
+    (specific fields, slices of lists) on demand. Least recently used results
+    are evicted once the store holds more than `max_bytes` of results.
+    """
+
+    def __init__(
+        self, max_entries=RESULT_STORE_MAX_ENTRIES, max_bytes=RESULT_STORE_MAX_BYTES, first_handle=1
+    ):
+        super().__init__(max_entries=max_entries, max_bytes=max_bytes)
+        self._next_handle = first_handle
+        self._handle_lock = threading.Lock()
+
+    def put(self, tool_name, tool_input, result, size=None, items_key=None):
+        """Store a result and return its handle, or None if it's too large to keep"""
+        with self._handle_lock:
+            handle = f"r{self._next_handle}"
+            self._next_handle += 1
+        entry = {"tool": tool_name, "input": tool_input, "result": result, "items_key": items_key}
+        self.set(handle, entry, size=size)
+        with self._lock:
+            return handle if handle in self._entries else None
+
+    def fetch(self, handle, fields=None, start=None, end=None):
+        """A stored result, optionally reduced to `fields` (dotted paths) and to items `start:end`.
+
+        Slices apply to lists. For results whose items are a field (`items_key`), fields
+        and slices apply to the items.
+        """
+        entry = self.get(handle)
+        if entry is None:
+            return None
+
+        result = entry["result"]
+        fetched = {"result_handle": handle, "tool": entry["tool"]}
+        items = get_items(result, entry.get("items_key"))
+        if items is not None:
+            result = items
+            fetched["total_items"] = len(items)
+            if start is not None or end is not None:
+                result = items[start:end]
+                fetched["items"] = f"{start or 0}:{end if end is not None else len(items)}"
+        if fields:
+            result = project(result, fields)
+        fetched["result"] = result
+        return fetched
+
+def omitted_from(result, summary, items_key=None):
+    """What a summary left out of a result: list items and top-level fields (of the items,
+    if any)"""
+    omitted = {}
+    result_items, summary_items = get_items(result, items_key), get_items(summary, items_key)
+    if result_items is not None and summary_items is not None:
+        result, summary = result_items, summary_items
+    if isinstance(result, list) and isinstance(summary, list):
+        if len(result) > len(summary):
+            omitted["items"] = len(result) - len(summary)
+        result, summary = (result[0], summary[0]) if result and summary else ({}, {})
+    if isinstance(result, dict) and isinstance(summary, dict):
+        fields = sorted(set(result) - set(summary))
+        if fields:
+            omitted["fields"] = fields
+    return omitted
+
+def summary_envelope(handle, summary, omitted):
+    """Tool message content for a stored result: its summary plus the handle to fetch the rest"""
+    return dumps({"result_handle": handle, "summary": summary, "omitted": omitted})
+
+def last_handle_number(history):
+    """Highest handle number (`rN`) mentioned by tool messages in `history`, 0 if none.
+
+    A store for a resumed session numbers its handles after it, so an old handle
+    left in the history can't name a new result.
+    """
+    last = 0
+    for message in history:
+        if not _is_envelope(message):
+            continue
+        try:
+            handle = json.loads(message["content"])["result_handle"]
+            last = max(last, int(handle[1:]))
+        except (ValueError, KeyError, TypeError):
+            continue
+    return last
+
+def collapse_stored_results(history):
+    """Replace the summaries of stored results in `history` by their handle alone"""
+    collapsed = 0
+    for message in history:
+        if not _is_envelope(message) or '"summary":' not in message["content"]:
+            continue
+        envelope = json.loads(message["content"])
+        if "summary" not in envelope:
+            continue
+        message["content"] = dumps({
+            "result_handle": envelope["result_handle"],
+            "note": "Result from an earlier turn, use tool_fetch_result to read it again"
+        })
+        collapsed += 1
+    return collapsed
@@ -0,0 +1,226 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+from utils.metrics import SCHEDULER_ACTIVE, SCHEDULER_QUEUE_DEPTH, SCHEDULER_WAIT_SECONDS
+
+# Turns running at once across all users (each one holds OpenRouter and Google Maps capacity)
+SCHEDULER_MAX_ACTIVE_TURNS = int(os.getenv("SCHEDULER_MAX_ACTIVE_TURNS", "32"))
+SCHEDULER_MAX_ACTIVE_TURNS_PER_USER = int(os.getenv("SCHEDULER_MAX_ACTIVE_TURNS_PER_USER", "2"))
+# Per-user token bucket, in model requests: a turn needs a token to start and pays for its
+# tool-loop iterations when done (0 disables it)
+SCHEDULER_USER_REQUESTS_PER_MINUTE = float(os.getenv("SCHEDULER_USER_REQUESTS_PER_MINUTE", "30"))
+SCHEDULER_USER_BURST = float(os.getenv("SCHEDULER_USER_BURST", "10"))
+
+# Seconds an idle user's last admission still counts against them when picking who goes next
+FAIRNESS_MEMORY = 60.0
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `burst`; the balance may go negative to charge
+    work after the fact"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def ready(self):
+        self._refill()
+        return self.tokens >= 1
+
+    def full(self):
+        self._refill()
+        return self.tokens >= self.burst
+
+    def charge(self, tokens=1):
+        self._refill()
+        self.tokens -= tokens
+
+    def wait_time(self):
+        """Seconds until a token is available"""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+class Ticket:
+    """A turn's place in the scheduler, admitted once `future` is done"""
+
+    def __init__(self, user):
+        self.user = user
+        self.future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.time()
+        self.admitted_at = None
+
+    @property
+    def admitted(self):
+        return self.admitted_at is not None
+
+    async def wait(self, timeout=None):
+        """Whether the ticket was admitted within `timeout` seconds"""
+        if not self.future.done():
+            await asyncio.wait({self.future}, timeout=timeout)
+        return self.future.done()
+
+class FairScheduler:
+    """Admission control for turns: a global cap, per-user caps and token buckets, round-robin.
+
+    Waiting turns are queued per user; a free slot goes to the user served
+    least recently, so a user with many queued turns (or long tool loops, which
+    drain their bucket) can't starve the others. Nothing is rejected or timed
+    out: callers wait on their ticket and can show its queue position.
+    Everything runs on the event loop, no locking needed: `stats()` (called from
+    the metrics thread) only reads counters the loop publishes after each change.
+    """
+
+    def __init__(
+        self,
+        max_active=SCHEDULER_MAX_ACTIVE_TURNS,
+        max_active_per_user=SCHEDULER_MAX_ACTIVE_TURNS_PER_USER,
+        rate=SCHEDULER_USER_REQUESTS_PER_MINUTE / 60,
+        burst=SCHEDULER_USER_BURST
+    ):
+        self.max_active = max_active
+        self.max_active_per_user = max_active_per_user
+        self.rate = rate
+        self.burst = burst
+        self._waiting = {}
+        self._active = {}
+        self._last_admitted = {}
+        self._buckets = {}
+        self._timer = None
+        self._counts = {"active": 0, "queued": 0, "waiting_users": 0}
+        self.admitted = 0
+        self.total_wait_seconds = 0.0
+
+    def enqueue(self, user):
+        ticket = Ticket(user)
+        self._waiting.setdefault(user, deque()).append(ticket)
+        self._dispatch()
+        return ticket
+
+    def release(self, ticket, cost=1):
+        """Done with the ticket: free its slot and charge the user's bucket for `cost` requests
+        beyond the first"""
+        if ticket.admitted:
+            self._active[ticket.user] -= 1
+            if not self._active[ticket.user]:
+                del self._active[ticket.user]
+            if cost > 1 and self.rate > 0:
+                self._bucket(ticket.user).charge(cost - 1)
+        else:
+            # Left the queue before its turn (cancelled, or the user went away)
+            queue = self._waiting.get(ticket.user)
+            if queue and ticket in queue:
+                queue.remove(ticket)
+                if not queue:
+                    del self._waiting[ticket.user]
+            ticket.future.cancel()
+        self._dispatch()
+
+    def position(self, ticket):
+        """1-based position of a waiting ticket among all waiting tickets (by arrival)"""
+        return 1 + sum(
+            1 for queue in self._waiting.values() for other in queue
+            if other.enqueued_at < ticket.enqueued_at
+        )
+
+    def queued(self):
+        return sum(len(queue) for queue in self._waiting.values())
+
+    def stats(self):
+        return {
+            **self._counts,
+            "admitted": self.admitted,
+            "mean_wait_seconds": self.total_wait_seconds / self.admitted if self.admitted else 0.0
+        }
+
+    def _bucket(self, user):
+        bucket = self._buckets.get(user)
+        if bucket is None:
+            bucket = self._buckets[user] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def _eligible(self, user):
+        if self._active.get(user, 0) >= self.max_active_per_user:
+            return False
+        return self.rate <= 0 or self._bucket(user).ready()
+
+    def _next_user(self):
+        eligible = [user for user in self._waiting if self._eligible(user)]
+        if not eligible:
+            return None
+        # Whoever was served least recently goes first, then whoever has waited longest
+        def order(user):
+            return self._last_admitted.get(user, 0.0), self._waiting[user][0].enqueued_at
+        return min(eligible, key=order)
+
+    def _dispatch(self):
+        active = sum(self._active.values())
+        while active < self.max_active:
+            user = self._next_user()
+            if user is None:
+                break
+
+            queue = self._waiting[user]
+            ticket = queue.popleft()
+            if not queue:
+                del self._waiting[user]
+
+            if self.rate > 0:
+                self._bucket(user).charge()
+            self._active[user] = self._active.get(user, 0) + 1
+            active += 1
+            ticket.admitted_at = self._last_admitted[user] = time.time()
+            wait = ticket.admitted_at - ticket.enqueued_at
+            self.admitted += 1
+            self.total_wait_seconds += wait
+            SCHEDULER_WAIT_SECONDS.observe(wait)
+            if not ticket.future.done():
+                ticket.future.set_result(True)
+
+        # Users only held back by their bucket are looked at again once it refills
+        if self._timer:
+            self._timer.cancel()
+        self._timer = None
+        refills = [
+            self._bucket(user).wait_time() for user in self._waiting
+            if self.rate > 0 and self._active.get(user, 0) < self.max_active_per_user
+        ]
+        refills = [seconds for seconds in refills if seconds > 0]
+        if active < self.max_active and refills:
+            self._timer = asyncio.get_running_loop().call_later(min(refills), self._dispatch)
+
+        # A full bucket is the same as a new one, idle users don't need to keep theirs
+        # (nor an old admission)
+        def idle(user):
+            return user not in self._waiting and user not in self._active
+        for user in list(self._buckets):
+            if idle(user) and self._buckets[user].full():
+                del self._buckets[user]
+        forgotten = time.time() - FAIRNESS_MEMORY
+        for user in list(self._last_admitted):
+            if idle(user) and self._last_admitted[user] < forgotten:
+                del self._last_admitted[user]
+
+        queued = self.queued()
+        # Replaced whole, so a reader on another thread never sees it half updated
+        self._counts = {"active": active, "queued": queued, "waiting_users": len(self._waiting)}
+        SCHEDULER_ACTIVE.set(active)
+        SCHEDULER_QUEUE_DEPTH.set(queued)
+
+_scheduler = None
+
+def get_scheduler():
+    """Process-wide scheduler, created on first use (from the event loop)"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = FairScheduler()
+    return _scheduler
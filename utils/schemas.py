@@ -0,0 +1,32 @@
+import copy
+
+# Enums longer than this are dropped from the compact schema
+COMPACT_ENUM_MAX_SIZE = 32
+
+def compact_schema(schema):
+    """Copy of a JSON schema with large enums replaced by a short hint.
+
+    The property keeps its `examples` (or the first few enum values) in its
+    description, and the tool is expected to validate the value server-side.
+    """
+    schema = copy.deepcopy(schema)
+    _compact(schema)
+    return schema
+
+def _compact(node):
+    if isinstance(node, list):
+        for item in node:
+            _compact(item)
+        return
+    if not isinstance(node, dict):
+        return
+
+    enum = node.get("enum")
+    if isinstance(enum, list) and len(enum) > COMPACT_ENUM_MAX_SIZE:
+        examples = node.pop("examples", None) or enum[:8]
+        description = node.get("description", "").rstrip(".")
+        node["description"] = f"{description} (eg: {', '.join(examples)})".strip()
+        del node["enum"]
+
+    for value in node.values():
+        _compact(value)
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def _estimate_size(state):
+    """Rough in-memory footprint of a session: bytes of serialized state, plus what its stores
+    (anything with `stats()`) report"""
+    stores = {key: value for key, value in state.items() if callable(getattr(value, "stats", None))}
+    rest = {key: value for key, value in state.items() if key not in stores}
+    store_bytes = sum(store.stats()["bytes"] for store in stores.values())
+    return len(json.dumps(rest, default=str)) + store_bytes
+
+class SessionStore:
+    """Session-keyed conversation state with idle eviction and a memory cap.
+
+    Each session gets its own state dict built by `factory`, or restored by
+    `loader` (if given) when fetched with `load()`. Sessions unused for longer
+    than `idle_ttl` seconds are dropped, and the least recently used ones are
+    evicted while the store holds more than `max_sessions` sessions or more
+    than `max_bytes` of (estimated) state.
+    """
+
+    def __init__(
+        self, factory, idle_ttl=3600, max_sessions=1000, max_bytes=256 * 1024 * 1024, loader=None
+    ):
+        self.factory = factory
+        self.loader = loader
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, session_id):
+        """Return the state for `session_id`, creating it if needed"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                entry = {"state": self.factory(), "last_access": 0.0, "size": 0}
+                self._sessions[session_id] = entry
+            entry["last_access"] = time.time()
+            self._sessions.move_to_end(session_id)
+            self._evict(keep=session_id)
+            return entry["state"]
+
+    async def load(self, session_id):
+        """Like `get()`, but a session not in memory is first looked up with `loader`, off the
+        event loop"""
+        if self.loader is not None:
+            with self._lock:
+                missing = session_id not in self._sessions
+            if missing:
+                state = await asyncio.to_thread(self.loader, session_id)
+                with self._lock:
+                    # Another turn may have created the session meanwhile, it wins
+                    if state is not None and session_id not in self._sessions:
+                        self._sessions[session_id] = {"state": state, "last_access": 0.0, "size": 0}
+        return self.get(session_id)
+
+    def touch(self, session_id):
+        """Refresh the size estimate of a session after it changed, evicting others if over
+        the cap"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return
+            entry["size"] = _estimate_size(entry["state"])
+            entry["last_access"] = time.time()
+            self._evict(keep=session_id)
+
+    def drop(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": sum(entry["size"] for entry in self._sessions.values()),
+                "evictions": self.evictions
+            }
+
+    def _evict(self, keep):
+        # Idle sessions first
+        now = time.time()
+        idle = [
+            session_id for session_id, entry in self._sessions.items()
+            if now - entry["last_access"] > self.idle_ttl
+        ]
+        for session_id in idle:
+            if session_id == keep:
+                continue
+            del self._sessions[session_id]
+            self.evictions += 1
+
+        # Then least recently used ones until back under the caps
+        total_bytes = sum(entry["size"] for entry in self._sessions.values())
+        def over_caps():
+            return len(self._sessions) > self.max_sessions or total_bytes > self.max_bytes
+        while len(self._sessions) > 1 and over_caps():
+            session_id, entry = next(iter(self._sessions.items()))
+            if session_id == keep:
+                break
+            del self._sessions[session_id]
+            total_bytes -= entry["size"]
+            self.evictions += 1
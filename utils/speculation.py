@@ -0,0 +1,115 @@
+import asyncio
+import json
+import os
+
+from utils.executor import execute_tools
+
+# Opt-in: start read-only tool calls while the model is still streaming the rest of its message
+SPECULATIVE_TOOLS = os.getenv("SPECULATIVE_TOOLS", "false").lower() == "true"
+
+_DONE = object()
+
+def _parse_arguments(arguments):
+    """The arguments of a streamed tool call once they form a complete JSON object, else None"""
+    if not arguments.rstrip().endswith("}"):
+        return None
+    try:
+        tool_input = json.loads(arguments)
+    except ValueError:
+        return None
+    return tool_input if isinstance(tool_input, dict) else None
+
+class SpeculativeRun:
+    """A tool call started before its message finished streaming, buffering its events until
+    claimed"""
+
+    def __init__(self, tool_id, name, arguments, generator, timeout, deadline):
+        self.tool_id = tool_id
+        self.name = name
+        self.arguments = arguments
+        self.events = asyncio.Queue()
+        self.task = asyncio.create_task(self._run(generator, timeout, deadline))
+
+    async def _run(self, generator, timeout, deadline):
+        try:
+            jobs = [(self.tool_id, generator, False, timeout)]
+            async for _, tool_yield, tool_exception in execute_tools(jobs, deadline=deadline):
+                self.events.put_nowait((tool_yield, tool_exception))
+        finally:
+            self.events.put_nowait(_DONE)
+
+    async def replay(self):
+        """The run's tool yields as a tool generator: what it buffered so far, then the rest as
+        it comes"""
+        try:
+            while True:
+                event = await self.events.get()
+                if event is _DONE:
+                    return
+                tool_yield, tool_exception = event
+                if tool_exception is not None:
+                    raise tool_exception
+                yield tool_yield
+        finally:
+            if not self.task.done():
+                await self.cancel()
+
+    async def cancel(self):
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+class ToolSpeculator:
+    """Dispatches the tool calls of a streaming message as soon as their arguments are complete.
+
+    `dispatch(name, tool_input)` returns `(generator, timeout)` for a call worth
+    starting early (an enabled, read-only tool without a cached result) or None.
+    Once the message is complete, `claim()` hands over the run of each final tool
+    call, as long as its id, name and arguments are the ones that were started;
+    `discard()` cancels whatever wasn't claimed (the message ended differently).
+    """
+
+    def __init__(self, dispatch, deadline=None):
+        self.dispatch = dispatch
+        self.deadline = deadline
+        self.runs = {}
+        self._seen = set()
+        self.started = 0
+        self.claimed = 0
+        self.discarded = 0
+
+    def update(self, tool_calls):
+        """Start the streamed tool calls (StreamAccumulator.tool_calls) that just became complete"""
+        for index, tool_call in tool_calls.items():
+            if index in self._seen or not tool_call["id"] or not tool_call["name"]:
+                continue
+            tool_input = _parse_arguments(tool_call["arguments"])
+            if tool_input is None:
+                continue
+
+            self._seen.add(index)
+            dispatched = self.dispatch(tool_call["name"], tool_input)
+            if dispatched is None:
+                continue
+            generator, timeout = dispatched
+            self.runs[tool_call["id"]] = SpeculativeRun(
+                tool_call["id"], tool_call["name"], tool_call["arguments"],
+                generator, timeout, self.deadline
+            )
+            self.started += 1
+
+    def claim(self, tool_id, name, arguments):
+        """The speculative run's replay for a final tool call, or None if it wasn't started
+        (as is)"""
+        run = self.runs.get(tool_id)
+        if run is None or run.name != name or run.arguments != arguments:
+            return None
+        del self.runs[tool_id]
+        self.claimed += 1
+        return run.replay()
+
+    async def discard(self):
+        """Cancel the runs no final tool call claimed"""
+        runs, self.runs = list(self.runs.values()), {}
+        self.discarded += len(runs)
+        for run in runs:
+            await run.cancel()
@@ -0,0 +1,100 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+# Seconds writes may wait to be batched into one transaction
+SQLITE_KV_FLUSH_INTERVAL = 0.05
+
+
+class SQLiteKV:
+    """JSON values by key in one table of an SQLite file (WAL mode), shared by worker processes.
+
+    Reads are synchronous; callers on the event loop should run them with
+    `asyncio.to_thread`. Writes are queued and committed in batches by a writer
+    thread, so they never wait on the disk (a read right after a write may not
+    see it yet, callers keep an in-memory cache in front). Entries older than
+    `ttl` seconds read as missing.
+    """
+
+    def __init__(self, path, table, ttl=None, flush_interval=SQLITE_KV_FLUSH_INTERVAL):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self.failed_writes = 0
+
+    def get(self, key):
+        with self._db_lock:
+            row = self._connect().execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        if self.ttl is not None and row[1] + self.ttl <= time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value, created_at=None):
+        created_at = time.time() if created_at is None else created_at
+        self._start_writer()
+        self._queue.put((key, json.dumps(value, default=str), created_at))
+
+    def flush(self):
+        """Wait until everything queued so far is written"""
+        self._queue.join()
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+        return self._db
+
+    def _start_writer(self):
+        with self._writer_lock:
+            if self._writer is not None:
+                return
+            self._writer = threading.Thread(
+                target=self._write_loop, name=f"sqlite-{self.table}", daemon=True
+            )
+            self._writer.start()
+            atexit.register(self.flush)
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            # Whatever else arrives within the flush interval goes into the same transaction
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                with self._db_lock:
+                    db = self._connect()
+                    with db:
+                        db.executemany(
+                            f"INSERT OR REPLACE INTO {self.table} (key, value, created_at) "
+                            "VALUES (?, ?, ?)",
+                            batch,
+                        )
+            except Exception:
+                # A cache write is best effort, a failed batch must not stop the writer
+                self.failed_writes += len(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
@@ -0,0 +1,73 @@
+import time
+from types import SimpleNamespace
+
+
+class StreamAccumulator:
+    """Rebuilds a chat completion message from streamed chunks.
+
+    Text deltas are returned from `add()` as they arrive so callers can render
+    them, while tool call id/name/argument fragments are stitched together by
+    their `index` so the assembled message looks like a non-streamed one.
+    """
+
+    def __init__(self):
+        self.content = ""
+        self.tool_calls = {}
+        self.usage = None
+        self.finish_reason = None
+        self.first_token_time = None
+
+    def add(self, chunk):
+        if getattr(chunk, "usage", None):
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return ""
+
+        choice = chunk.choices[0]
+        if choice.finish_reason:
+            self.finish_reason = choice.finish_reason
+        delta = choice.delta
+        if delta is None:
+            return ""
+
+        text = delta.content or ""
+        if (text or delta.tool_calls) and self.first_token_time is None:
+            self.first_token_time = time.time()
+        self.content += text
+
+        for fragment in delta.tool_calls or []:
+            tool_call = self.tool_calls.setdefault(
+                fragment.index, {"id": None, "name": "", "arguments": ""}
+            )
+            if fragment.id:
+                tool_call["id"] = fragment.id
+            function = fragment.function
+            if function is None:
+                continue
+            if function.name:
+                tool_call["name"] += function.name
+            if function.arguments:
+                tool_call["arguments"] += function.arguments
+
+        return text
+
+    def message(self):
+        """Return the assembled message, shaped like `response.choices[0].message`."""
+        tool_calls = [
+            SimpleNamespace(
+                id=tool_call["id"],
+                type="function",
+                function=SimpleNamespace(
+                    name=tool_call["name"], arguments=tool_call["arguments"] or "{}"
+                )
+            )
+            for _, tool_call in sorted(self.tool_calls.items())
+        ]
+        return SimpleNamespace(content=self.content or None, tool_calls=tool_calls or None)
+
+async def close_stream(stream):
+    """Release a response stream (an OpenAI `AsyncStream` or an async generator wrapping one)
+    early"""
+    close = getattr(stream, "aclose", None) or getattr(stream, "close", None)
+    if close:
+        await close()
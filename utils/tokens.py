@@ -0,0 +1,27 @@
+import json
+
+_encoding = None
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    return _encoding
+
+def estimate_tokens(value):
+    """Token count of a string (or JSON-serializable value).
+
+    Uses tiktoken when it is installed, otherwise falls back to the usual
+    ~4 characters per token approximation, which is close enough for budgeting.
+    """
+    text = value
+    if not isinstance(text, str):
+        text = json.dumps(text, separators=(",", ":"), default=str)
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
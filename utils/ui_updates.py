@@ -0,0 +1,62 @@
+import os
+import time
+
+import gradio as gr
+
+# Minimum seconds between two updates of a turn pushed to the browser (0 pushes every update)
+UI_FRAME_INTERVAL = float(os.getenv("UI_FRAME_INTERVAL", "0.05"))
+
+def _layout(messages):
+    return len(messages), tuple((message.metadata or {}).get("status") for message in messages)
+
+class UpdateCoalescer:
+    """Turns a turn's stream of chat states into the (fewer) updates worth sending to the UI.
+
+    Every update makes Gradio re-process and diff the whole chat, so updates that
+    only grow a bubble (streamed text, tool progress) are sent at most once per
+    frame interval, the latest state replacing the ones in between. Updates that
+    change the layout (a new bubble, a tool finishing) go out right away. The
+    sidebar is only re-rendered when its version changed and skipped otherwise.
+    """
+
+    def __init__(self, render_sidebar, interval=UI_FRAME_INTERVAL):
+        self.render_sidebar = render_sidebar
+        self.interval = interval
+        self.pending = None
+        self.sent = 0
+        self.dropped = 0
+        self._last_sent_at = None
+        self._last_layout = None
+        self._sidebar_version = None
+
+    def offer(self, messages, sidebar_version):
+        """The update to send for this chat state, or None if it's held back for a later frame"""
+        layout = _layout(messages)
+        now = time.monotonic()
+        if layout == self._last_layout and now - self._last_sent_at < self.interval:
+            if self.pending is not None:
+                self.dropped += 1
+            self.pending = (messages, sidebar_version)
+            return None
+        return self._send(messages, sidebar_version, layout, now)
+
+    def flush(self):
+        """The held back update, if any"""
+        if self.pending is None:
+            return None
+        messages, sidebar_version = self.pending
+        return self._send(messages, sidebar_version, _layout(messages), time.monotonic())
+
+    def wait_time(self):
+        """Seconds until the held back update is due"""
+        return max(0.0, self._last_sent_at + self.interval - time.monotonic())
+
+    def _send(self, messages, sidebar_version, layout, now):
+        self.pending = None
+        self.sent += 1
+        self._last_sent_at = now
+        self._last_layout = layout
+        if sidebar_version == self._sidebar_version:
+            return messages, gr.skip()
+        self._sidebar_version = sidebar_version
+        return messages, self.render_sidebar()